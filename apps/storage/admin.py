@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Folder, File, FileUploadSession, CustomUser, Role
+from .models import Folder, File, Blob, BlobAlias, Rendition, FileUploadSession, UploadJob, CustomUser, Role
 
 
 @admin.register(Folder)
@@ -20,6 +20,37 @@ class FileAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
 
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'file', 'size', 'ref_count', 'created_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(BlobAlias)
+class BlobAliasAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'blob', 'created_at')
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'blob', 'created_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(Rendition)
+class RenditionAdmin(admin.ModelAdmin):
+    list_display = ('file', 'name', 'width', 'height', 'bandwidth', 'created_at')
+    readonly_fields = ('file', 'name', 'width', 'height', 'bandwidth', 'playlist', 'created_at')
+    ordering = ('file', '-bandwidth')
+
+
+@admin.register(UploadJob)
+class UploadJobAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'status', 'folder', 'created_at', 'updated_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('session', 'file', 'error', 'created_at', 'updated_at')
+    ordering = ('-created_at',)
+
+
 admin.site.register(FileUploadSession)
 admin.site.register(CustomUser)
 admin.site.register(Role)
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class StorageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'storage'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Фоновая очистка брошенных загрузок стартует с первым запросом,
+        # чтобы не запускаться в manage.py migrate и прочих командах
+        from .reaper import start_reaper
+        request_started.connect(start_reaper, dispatch_uid="storage-start-reaper")
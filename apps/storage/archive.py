@@ -0,0 +1,143 @@
+"""
+Потоковый ZIP64-архив поддерева папки: без временных файлов на диске,
+первые байты уходят клиенту сразу
+"""
+import os
+import time
+import logging
+import zipfile
+from .models import File, Folder
+from .uploads import get_buffer_size
+
+
+logger = logging.getLogger(__name__)
+
+# Медиа уже сжато — храним как есть, не тратя CPU
+STORED_TYPES = ("audio", "video", "image")
+STORED_EXTENSIONS = (".zip", ".gz", ".7z", ".rar", ".pdf", ".docx", ".xlsx", ".pptx")
+
+
+class _ZipSink:
+    """
+    Приёмник для ZipFile без seek: zipfile пишет записи с data descriptor,
+    а накопленные байты забираются генератором через pop()
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def write(self, data):
+        self._buffer += data
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _safe_name(name):
+    name = name.replace("/", "_").replace("\\", "_").strip()
+    return name if name not in ("", ".", "..") else "_"
+
+
+def _unique(name, taken):
+    """Имя без повторов внутри одного каталога архива: a.mp4, a (1).mp4, ..."""
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate.lower() in taken:
+        candidate = f"{base} ({n}){ext}"
+        n += 1
+    taken.add(candidate.lower())
+    return candidate
+
+
+def folder_entries(folder):
+    """
+    Список записей архива (arcname, path, file_type) для поддерева folder;
+    у каталогов path равен None. Метаданные читаются из БД заранее — двумя
+    запросами по пути папки, чтобы во время отдачи не держать соединение.
+    """
+    children, files = {}, {}
+    for sub in Folder.objects.filter(path__startswith=folder.path).exclude(pk=folder.pk).only("name", "parent_id"):
+        children.setdefault(sub.parent_id, []).append(sub)
+    for file in File.objects.filter(folder__path__startswith=folder.path).only("name", "file", "file_type", "folder_id"):
+        files.setdefault(file.folder_id, []).append(file)
+
+    root = _safe_name(folder.name)
+    entries = [(f"{root}/", None, None)]
+    prefixes = {folder.pk: root}
+    level = [folder.pk]
+
+    while level:
+        next_level = []
+        for pk in level:
+            taken = set()
+            for file in files.get(pk, []):
+                arcname = _unique(_safe_name(file.name), taken)
+                entries.append((f"{prefixes[pk]}/{arcname}", file.file.path, file.file_type))
+            for sub in children.get(pk, []):
+                arcname = _unique(_safe_name(sub.name), taken)
+                prefixes[sub.pk] = f"{prefixes[pk]}/{arcname}"
+                entries.append((f"{prefixes[sub.pk]}/", None, None))
+                next_level.append(sub.pk)
+        level = next_level
+    return entries
+
+
+def _compress_type(path, file_type):
+    if file_type in STORED_TYPES or path.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries, buffer_size=None):
+    """
+    Генератор байтов ZIP. Записи больше 4 ГБ и архивы с >65535 записями
+    автоматически получают расширения ZIP64. Память — один буфер чтения.
+    """
+    for chunk in _zip_chunks(entries, buffer_size or get_buffer_size()):
+        if chunk:
+            yield chunk
+
+
+def _zip_chunks(entries, buffer_size):
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for arcname, path, file_type in entries:
+            if path is None:
+                info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+                info.external_attr = 0o40755 << 16 | 0x10
+                zf.writestr(info, b"")
+                yield sink.pop()
+                continue
+
+            try:
+                src = open(path, "rb")
+            except OSError:
+                logger.warning("Файл %s отсутствует в хранилище, пропущен в архиве", path)
+                continue
+            with src:
+                stat = os.fstat(src.fileno())
+                info = zipfile.ZipInfo(arcname, time.localtime(stat.st_mtime)[:6])
+                info.external_attr = 0o644 << 16
+                info.compress_type = _compress_type(path, file_type)
+                # Известный заранее размер — zipfile сам решает, нужен ли ZIP64
+                info.file_size = stat.st_size
+                with zf.open(info, "w") as dst:
+                    while True:
+                        block = src.read(buffer_size)
+                        if not block:
+                            break
+                        dst.write(block)
+                        yield sink.pop()
+            yield sink.pop()
+    yield sink.pop()
@@ -0,0 +1,251 @@
+"""
+Хранилище blob'ов по содержимому (SHA-256) с подсчётом ссылок
+"""
+import os
+import uuid
+import hashlib
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from .models import Blob, BlobAlias, File
+from .purge import DERIVED, FILE, purge_later
+
+
+def blob_name(sha256, ext=""):
+    """
+    Путь blob'а относительно MEDIA_ROOT: blobs/ab/cd/<sha256>-<суффикс><ext>.
+    Суффикс у каждого появления содержимого свой: отложенное удаление
+    прежнего blob'а с тем же sha256 не заденет файл и производные нового
+    """
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}-{uuid.uuid4().hex[:12]}{ext.lower()}"
+
+
+def blob_key(name):
+    """Ключ производных артефактов blob'а — имя его файла без расширения"""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def incoming_path():
+    """
+    Временный путь для сборки файла рядом с blob'ами — на той же файловой
+    системе, чтобы перенос в хранилище был простым переименованием
+    """
+    incoming_dir = os.path.join(settings.MEDIA_ROOT, "blobs", "incoming")
+    os.makedirs(incoming_dir, exist_ok=True)
+    return os.path.join(incoming_dir, uuid.uuid4().hex)
+
+
+def derived_key(file_obj):
+    """Ключ производных артефактов: по файлу blob'а, у старых файлов — по id"""
+    return blob_key(file_obj.file.name) if file_obj.blob_id else f"file-{file_obj.pk}"
+
+
+def derived_version(file_obj):
+    """
+    Часть URL производных артефактов, привязанная к содержимому: после замены
+    файла старые ссылки перестают работать, поэтому ответы кэшируются навсегда
+    """
+    return derived_key(file_obj)[:16]
+
+
+def derived_dir(key):
+    """Каталог производных артефактов (HLS, превью и т.п.) для ключа содержимого"""
+    return os.path.join(settings.MEDIA_ROOT, "derived", key)
+
+
+def release_derived(key):
+    """Удаляет производные артефакты после коммита"""
+    purge_later([(DERIVED, key)])
+
+
+def is_valid_sha256(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+# ==============================
+# 🔹 Ссылки на blob'ы
+# ==============================
+def store_blob(path, sha256, ext="", size=None):
+    """
+    Переносит файл path в хранилище и возвращает Blob с уже учтённой ссылкой.
+    Если такое содержимое уже есть — path удаляется, а ссылка добавляется к
+    существующему blob'у.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    name = blob_name(sha256, ext)
+
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=sha256).first()
+        if blob is None:
+            final_path = os.path.join(settings.MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(path, final_path)
+            return Blob.objects.create(sha256=sha256, file=name, size=size, ref_count=1)
+
+        os.remove(path)
+        Blob.objects.filter(pk=sha256).update(ref_count=F("ref_count") + 1)
+        blob.refresh_from_db()
+        return blob
+
+
+def acquire_blob(sha256):
+    """
+    Добавляет ссылку на известный blob; None, если такого содержимого нет.
+    sha256 исходника, который сервер перепаковал, ведёт к перепакованному blob'у.
+    """
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=sha256).first()
+        if blob is None:
+            alias = BlobAlias.objects.filter(pk=sha256).values_list("blob_id", flat=True).first()
+            blob = alias and Blob.objects.select_for_update().filter(pk=alias).first()
+            if not blob:
+                return None
+        Blob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+        blob.refresh_from_db()
+        return blob
+
+
+def add_alias(sha256, blob):
+    """Запоминает, что содержимое с sha256 сервер заменил на blob (перепаковка)"""
+    if sha256 != blob.pk:
+        BlobAlias.objects.update_or_create(sha256=sha256, defaults={"blob": blob})
+
+
+def release_blob(sha256):
+    """Убирает ссылку; последний освободившийся blob удаляется с диска после коммита"""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=sha256).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            Blob.objects.filter(pk=sha256).update(ref_count=F("ref_count") - 1)
+            return
+        name = blob.file.name
+        blob.delete()
+        purge_later(_blob_purge_items(name))
+
+
+def _blob_purge_items(name):
+    # Файл и производные удалённого blob'а: имена свои у каждого появления
+    # содержимого, поэтому загруженный заново blob они не задевают
+    return [(FILE, name), (DERIVED, blob_key(name))]
+
+
+def store_uploaded_file(uploaded):
+    """
+    Кладёт UploadedFile в хранилище. Если HashingUploadHandler уже посчитал
+    SHA-256 и сбросил файл на диск — это одно переименование без повторного чтения.
+    """
+    ext = os.path.splitext(uploaded.name)[1]
+    sha256 = getattr(uploaded, "sha256", None)
+    if sha256 and hasattr(uploaded, "temporary_file_path"):
+        return store_blob(uploaded.temporary_file_path(), sha256, ext, size=uploaded.size)
+
+    path = incoming_path()
+    hasher = hashlib.sha256()
+    with open(path, "wb") as f:
+        for chunk in uploaded.chunks():
+            f.write(chunk)
+            if not sha256:
+                hasher.update(chunk)
+    return store_blob(path, sha256 or hasher.hexdigest(), ext, size=uploaded.size)
+
+
+def release_content(blob_id, name):
+    """Освобождает содержимое: ссылку на blob или (у старых файлов) отдельный файл name"""
+    if blob_id:
+        release_blob(blob_id)
+    elif name:
+        purge_later([(FILE, name)])
+
+
+def release_files(files, batch_size=500):
+    """
+    Освобождает содержимое многих уже удалённых записей File разом:
+    files — тройки (id, blob_id, имя файла). Ссылки на blob'ы уменьшаются
+    одним UPDATE на пачку и величину уменьшения, освободившиеся blob'ы
+    удаляются одним DELETE, а файлы с диска — фоновой очередью
+    """
+    counts = Counter(blob_id for _, blob_id, _ in files if blob_id)
+    items = []
+    for pk, blob_id, name in files:
+        # У старых файлов без blob'а — свой файл и свои производные
+        if not blob_id:
+            items.append((DERIVED, f"file-{pk}"))
+            if name:
+                items.append((FILE, name))
+
+    blob_ids = list(counts)
+    with transaction.atomic():
+        for start in range(0, len(blob_ids), batch_size):
+            blobs = Blob.objects.select_for_update().filter(pk__in=blob_ids[start:start + batch_size])
+            dead, by_delta = [], defaultdict(list)
+            for blob in blobs:
+                if blob.ref_count <= counts[blob.pk]:
+                    dead.append(blob)
+                else:
+                    by_delta[counts[blob.pk]].append(blob.pk)
+            for delta, pks in by_delta.items():
+                Blob.objects.filter(pk__in=pks).update(ref_count=F("ref_count") - delta)
+            Blob.objects.filter(pk__in=[blob.pk for blob in dead]).delete()
+            for blob in dead:
+                items += _blob_purge_items(blob.file.name)
+        purge_later(items)
+
+
+def rebuild_blob_refs(dry_run=False, batch_size=500):
+    """
+    Сверяет ref_count blob'ов с числом ссылающихся записей File и исправляет
+    расхождения; blob'ы без ссылок удаляются вместе с файлами на диске.
+    Возвращает число исправленных blob'ов.
+    """
+    fixed = 0
+    blob_ids = list(Blob.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(blob_ids), batch_size):
+        with transaction.atomic():
+            blobs = Blob.objects.select_for_update().filter(pk__in=blob_ids[start:start + batch_size])
+            counts = dict(
+                File.objects.filter(blob__in=blob_ids[start:start + batch_size])
+                .values("blob_id").annotate(refs=Count("pk")).values_list("blob_id", "refs")
+            )
+            dead, stale = [], []
+            for blob in blobs:
+                refs = counts.get(blob.pk, 0)
+                if blob.ref_count == refs:
+                    continue
+                if refs:
+                    blob.ref_count = refs
+                    stale.append(blob)
+                else:
+                    dead.append(blob)
+            fixed += len(dead) + len(stale)
+            if dry_run:
+                continue
+            Blob.objects.bulk_update(stale, ["ref_count"])
+            Blob.objects.filter(pk__in=[blob.pk for blob in dead]).delete()
+            purge_later(item for blob in dead for item in _blob_purge_items(blob.file.name))
+    return fixed
+
+
+def replace_file_content(file_obj, blob, name, file_type):
+    """
+    Переключает File на новый blob (токен и id не меняются) и освобождает
+    старое содержимое. Ссылка на blob должна быть уже учтена.
+    """
+    with transaction.atomic():
+        old_blob_id, old_name = file_obj.blob_id, file_obj.file.name
+
+        file_obj.file = blob.file.name
+        file_obj.blob = blob
+        file_obj.name = name
+        file_obj.size = blob.size
+        file_obj.file_type = file_type
+        # Производные от содержимого значения считаются заново
+        file_obj.page_count = None
+        file_obj.save()
+
+        release_content(old_blob_id, old_name)
+        if not old_blob_id:
+            release_derived(f"file-{file_obj.pk}")
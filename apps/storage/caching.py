@@ -0,0 +1,85 @@
+"""
+Валидаторы кэша (ETag / Last-Modified), ответы 304 и версии папок
+"""
+import hashlib
+from functools import wraps
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from .models import Folder, path_ids
+
+
+# JSON по токену: кэшировать можно, но перед использованием — проверить (дёшево, 304)
+REVALIDATE = {"no_cache": True}
+# Артефакты, которые по своему адресу никогда не меняются (QR, превью)
+IMMUTABLE = {"public": True, "max_age": 365 * 24 * 60 * 60, "immutable": True}
+
+
+def make_etag(*parts):
+    """Короткий непрозрачный ETag из значений, от которых зависит ответ"""
+    return hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:32]
+
+
+# ==============================
+# 🔹 Версии папок
+# ==============================
+def folder_ancestor_ids(*folder_ids):
+    """id папок и всех их предков вверх до корня — один запрос за путями"""
+    ids = set()
+    for path in Folder.objects.filter(pk__in=[pk for pk in folder_ids if pk is not None]).values_list("path", flat=True):
+        ids.update(path_ids(path))
+    return ids
+
+
+def bump_folder_versions(*folder_ids):
+    """
+    Увеличивает version у папок и всех их предков: содержимое папки по токену
+    включает всё поддерево, поэтому любое изменение внутри меняет ETag предков
+    """
+    ids = folder_ancestor_ids(*folder_ids)
+    if ids:
+        Folder.objects.filter(pk__in=ids).update(version=F("version") + 1, updated_at=timezone.now())
+
+
+def bump_subtree_versions(path):
+    """
+    Увеличивает version у всего поддерева: после переименования или
+    перемещения папки меняются хлебные крошки во всех вложенных папках
+    """
+    Folder.objects.filter(path__startswith=path).update(version=F("version") + 1, updated_at=timezone.now())
+
+
+# ==============================
+# 🔹 Условные запросы
+# ==============================
+def conditional(validators, cache_control=None):
+    """
+    Декоратор метода APIView. validators(request, *args, **kwargs) возвращает
+    (etag, last_modified) по лёгкому запросу к БД или None (объекта нет —
+    метод сам ответит 404). Если клиент прислал совпадающие If-None-Match /
+    If-Modified-Since, сразу возвращается 304 без сериализации.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            found = validators(request, *args, **kwargs)
+            if found is None:
+                return method(self, request, *args, **kwargs)
+
+            etag, last_modified = found
+            etag = quote_etag(etag)
+            last_modified = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                response["ETag"] = etag
+                if last_modified:
+                    response["Last-Modified"] = http_date(last_modified)
+                patch_cache_control(response, **(cache_control or REVALIDATE))
+            return response
+        return wrapper
+    return decorator
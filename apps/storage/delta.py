@@ -0,0 +1,162 @@
+"""
+Дельта-замена файла: манифест хэшей блоков и сборка новой версии
+из блоков старой и присланных клиентом байтов
+"""
+import os
+import json
+import zlib
+import hashlib
+from django.conf import settings
+from .blobs import derived_dir, derived_key
+from .uploads import copy_range, get_buffer_size, hash_file
+
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024  # 1 МБ
+MIN_BLOCK_SIZE = 64 * 1024
+MAX_BLOCK_SIZE = 64 * 1024 * 1024
+
+
+class DeltaError(ValueError):
+    """Некорректные инструкции сборки"""
+
+
+def get_block_size(value=None):
+    if value in (None, ""):
+        return getattr(settings, "DELTA_BLOCK_SIZE", DEFAULT_BLOCK_SIZE)
+    try:
+        block_size = int(value)
+    except (TypeError, ValueError):
+        raise DeltaError("block_size должен быть целым числом")
+    if not MIN_BLOCK_SIZE <= block_size <= MAX_BLOCK_SIZE:
+        raise DeltaError(f"block_size должен быть от {MIN_BLOCK_SIZE} до {MAX_BLOCK_SIZE}")
+    return block_size
+
+
+def content_sha256(file_obj):
+    """SHA-256 текущего содержимого File (у старых файлов без blob'а — считается)"""
+    if file_obj.blob_id:
+        return file_obj.blob_id
+    return hash_file(file_obj.file.path).hexdigest()
+
+
+# ==============================
+# 🔹 Манифест блоков
+# ==============================
+def build_manifest(path, block_size):
+    """
+    Хэши блоков файла фиксированного размера (последний может быть короче).
+    adler32 — слабая контрольная сумма, которую клиент может считать скользящим
+    окном, sha256 — сильная для подтверждения совпадения.
+    """
+    blocks = []
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            blocks.append({
+                "adler32": zlib.adler32(block),
+                "sha256": hashlib.sha256(block).hexdigest(),
+            })
+    return blocks
+
+
+def get_manifest(file_obj, block_size):
+    """
+    Манифест содержимого File. Для blob'ов результат кэшируется рядом с
+    производными артефактами: содержимое blob'а неизменно, поэтому кэш не
+    нужно инвалидировать, а удаляется он вместе с blob'ом.
+    """
+    if not file_obj.blob_id:
+        return build_manifest(file_obj.file.path, block_size)
+
+    cache_path = os.path.join(derived_dir(derived_key(file_obj)), "manifests", f"{block_size}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    blocks = build_manifest(file_obj.file.path, block_size)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(blocks, f)
+    os.replace(tmp_path, cache_path)
+    return blocks
+
+
+# ==============================
+# 🔹 Сборка новой версии
+# ==============================
+def parse_instructions(raw):
+    """
+    Инструкции — JSON-список операций по порядку:
+      {"op": "copy", "block": 3, "count": 10} — блоки 3..12 старой версии
+      {"op": "data", "length": 4096}         — следующие байты из части data
+    """
+    try:
+        instructions = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        raise DeltaError("instructions должен быть JSON-списком")
+    if not isinstance(instructions, list) or not instructions:
+        raise DeltaError("instructions должен быть непустым списком")
+
+    parsed = []
+    for op in instructions:
+        if not isinstance(op, dict):
+            raise DeltaError("каждая инструкция должна быть объектом")
+        try:
+            if op.get("op") == "copy":
+                parsed.append(("copy", int(op["block"]), int(op.get("count", 1))))
+            elif op.get("op") == "data":
+                parsed.append(("data", int(op["length"]), None))
+            else:
+                raise DeltaError(f"неизвестная операция {op.get('op')!r}")
+        except (KeyError, TypeError, ValueError):
+            raise DeltaError(f"некорректная инструкция {op!r}")
+    return parsed
+
+
+def apply_delta(base_path, instructions, data, block_size, out_path):
+    """
+    Собирает out_path: блоки старой версии копируются внутри ядра,
+    новые байты читаются из data (файлоподобный объект) блоками.
+    Возвращает размер результата.
+    """
+    base_size = os.path.getsize(base_path)
+    total_blocks = -(-base_size // block_size)
+    buffer_size = get_buffer_size()
+    offset = 0
+
+    base_fd = os.open(base_path, os.O_RDONLY)
+    out_fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        for kind, first, count in instructions:
+            if kind == "copy":
+                if first < 0 or count <= 0 or first + count > total_blocks:
+                    raise DeltaError(f"блоки {first}..{first + count - 1} вне старой версии")
+                start = first * block_size
+                length = min((first + count) * block_size, base_size) - start
+                offset += copy_range(base_fd, out_fd, offset, length, src_offset=start)
+                continue
+
+            length = first
+            if data is None or length < 0:
+                raise DeltaError("операция data без части data")
+            remaining = length
+            while remaining:
+                block = data.read(min(buffer_size, remaining))
+                if not block:
+                    raise DeltaError("в части data меньше байт, чем указано в инструкциях")
+                view = memoryview(block)
+                while view:
+                    n = os.pwrite(out_fd, view, offset)
+                    view = view[n:]
+                    offset += n
+                remaining -= len(block)
+
+        if data is not None and data.read(1):
+            raise DeltaError("в части data больше байт, чем указано в инструкциях")
+    finally:
+        os.close(base_fd)
+        os.close(out_fd)
+    return offset
@@ -0,0 +1,103 @@
+"""
+MP4/MOV fast-start: атом moov перед mdat, чтобы воспроизведение
+начиналось без загрузки хвоста файла
+"""
+import os
+import struct
+from django.db import transaction
+from . import ffmpeg
+from .blobs import add_alias, incoming_path, replace_file_content, store_blob
+from .uploads import hash_file
+
+
+MOOV_FRONT = "front"
+MOOV_END = "end"
+
+
+def read_top_level_boxes(path):
+    """
+    Типы атомов верхнего уровня по порядку (без чтения содержимого).
+    None, если файл не ISO BMFF (первым должен идти ftyp).
+    """
+    boxes = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offset = 0
+        while offset + 8 <= size:
+            f.seek(offset)
+            box_size, box_type = struct.unpack(">I4s", f.read(8))
+            header = 8
+            if box_size == 1:
+                box_size = struct.unpack(">Q", f.read(8))[0]
+                header = 16
+            elif box_size == 0:
+                box_size = size - offset
+            if box_size < header:
+                break
+            if not boxes and box_type != b"ftyp":
+                return None
+            boxes.append(box_type)
+            offset += box_size
+    return boxes
+
+
+def moov_position(path):
+    """MOOV_FRONT / MOOV_END или None (не MP4/MOV или нет moov)"""
+    boxes = read_top_level_boxes(path)
+    if not boxes or b"moov" not in boxes:
+        return None
+    if b"mdat" in boxes and boxes.index(b"mdat") < boxes.index(b"moov"):
+        return MOOV_END
+    return MOOV_FRONT
+
+
+def major_brand(path):
+    with open(path, "rb") as f:
+        return f.read(12)[8:12]
+
+
+def remux_faststart(source, out_path):
+    """Перепаковка без перекодирования: те же потоки, moov в начале"""
+    muxer = "mov" if major_brand(source) == b"qt  " else "mp4"
+    ffmpeg.run([
+        "-i", source, "-map", "0", "-dn", "-c", "copy", "-map_metadata", "0",
+        "-movflags", "+faststart", "-f", muxer, out_path,
+    ])
+
+
+def make_faststart(file_obj, key):
+    """
+    Обработчик ingest для видео. Если moov в конце — перепаковывает файл и
+    атомарно переключает File на новый blob (токен не меняется); sha256
+    исходника остаётся псевдонимом нового blob'а, а обработка нового
+    содержимого (HLS и т.д.) ставится в очередь заново.
+    """
+    from .ingest import enqueue_ingest, lock_current
+
+    position = moov_position(file_obj.file.path)
+    if position != MOOV_END:
+        return {"moov": position or "n/a"}
+
+    out_path = incoming_path()
+    try:
+        remux_faststart(file_obj.file.path, out_path)
+        if moov_position(out_path) != MOOV_FRONT:
+            raise ffmpeg.FFmpegError("после перепаковки moov всё ещё не в начале файла")
+        sha256 = hash_file(out_path).hexdigest()
+    except Exception:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+
+    with transaction.atomic():
+        current = lock_current(file_obj.pk, key)
+        if current is None:
+            os.remove(out_path)
+            return {}
+        blob = store_blob(out_path, sha256, os.path.splitext(current.name)[1])
+        # Повторная загрузка исходника по sha256 должна находить перепакованный blob
+        if current.blob_id:
+            add_alias(current.blob_id, blob)
+        replace_file_content(current, blob, current.name, current.file_type)
+        enqueue_ingest(current)
+    return {"moov": MOOV_FRONT, "remuxed": True}
@@ -0,0 +1,80 @@
+"""
+Запуск локальных ffmpeg / ffprobe
+"""
+import json
+import shutil
+import subprocess
+from django.conf import settings
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg недоступен или завершился с ошибкой"""
+
+
+def get_binary(name):
+    """Путь к ffmpeg / ffprobe из настроек (FFMPEG_BINARY / FFPROBE_BINARY)"""
+    binary = getattr(settings, f"{name.upper()}_BINARY", name)
+    path = shutil.which(binary)
+    if path is None:
+        raise FFmpegError(f"{binary} не найден")
+    return path
+
+
+def is_available():
+    try:
+        get_binary("ffmpeg")
+        get_binary("ffprobe")
+    except FFmpegError:
+        return False
+    return True
+
+
+def run(args, timeout=None):
+    """Запускает ffmpeg с аргументами args; при ошибке — FFmpegError с хвостом stderr"""
+    timeout = timeout or getattr(settings, "FFMPEG_TIMEOUT", 6 * 60 * 60)
+    cmd = [get_binary("ffmpeg"), "-hide_banner", "-nostdin", "-loglevel", "error", "-y", *args]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise FFmpegError(f"ffmpeg не уложился в {timeout} с")
+    if result.returncode != 0:
+        raise FFmpegError(result.stderr.decode(errors="replace")[-2000:] or f"код {result.returncode}")
+    return result
+
+
+def probe(path):
+    """
+    Основные параметры медиафайла: длительность, размер кадра, fps
+    и наличие звука
+    """
+    cmd = [
+        get_binary("ffprobe"), "-v", "error", "-print_format", "json",
+        "-show_format", "-show_streams", path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=120)
+    except subprocess.TimeoutExpired:
+        raise FFmpegError("ffprobe не уложился в 120 с")
+    if result.returncode != 0:
+        raise FFmpegError(result.stderr.decode(errors="replace")[-2000:] or f"код {result.returncode}")
+
+    info = json.loads(result.stdout or b"{}")
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not s.get("disposition", {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    fps = None
+    if video and video.get("avg_frame_rate", "0/0") != "0/0":
+        num, _, den = video["avg_frame_rate"].partition("/")
+        fps = float(num) / float(den or 1)
+
+    return {
+        "duration": float(info.get("format", {}).get("duration") or 0),
+        "width": int(video["width"]) if video else None,
+        "height": int(video["height"]) if video else None,
+        "fps": fps,
+        "video_codec": video.get("codec_name") if video else None,
+        "has_audio": audio is not None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+    }
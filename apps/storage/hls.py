@@ -0,0 +1,166 @@
+"""
+Упаковка видео в HLS: лесенка качеств (renditions) и плейлисты через ffmpeg
+"""
+import os
+import json
+import uuid
+import shutil
+from django.conf import settings
+from django.db import transaction
+from . import ffmpeg
+from .blobs import derived_dir
+from .models import Rendition
+
+
+DEFAULT_LADDER = [
+    {"name": "1080p", "height": 1080, "video_bitrate": 5000, "audio_bitrate": 128},
+    {"name": "720p", "height": 720, "video_bitrate": 2800, "audio_bitrate": 128},
+    {"name": "480p", "height": 480, "video_bitrate": 1400, "audio_bitrate": 96},
+    {"name": "360p", "height": 360, "video_bitrate": 800, "audio_bitrate": 96},
+]
+
+MASTER_PLAYLIST = "master.m3u8"
+LADDER_FILE = "ladder.json"
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+
+def hls_dir(key):
+    return os.path.join(derived_dir(key), "hls")
+
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def select_ladder(width, height):
+    """
+    Уровни лесенки не выше исходного видео (без апскейла); если исходник
+    меньше самого низкого уровня — один уровень в исходном размере
+    """
+    ladder = sorted(getattr(settings, "HLS_LADDER", DEFAULT_LADDER), key=lambda r: -r["height"])
+    rungs = [dict(r) for r in ladder if r["height"] <= height] or [dict(ladder[-1], height=height)]
+    for rung in rungs:
+        rung["height"] = _even(rung["height"])
+        rung["width"] = _even(width * rung["height"] / height)
+        # Пиковый битрейт: maxrate видео + аудио
+        rung["bandwidth"] = int((rung["video_bitrate"] * 1.07 + rung["audio_bitrate"]) * 1000)
+    return rungs
+
+
+def build_args(source, out_dir, rungs, has_audio, segment_seconds):
+    """Одна команда ffmpeg: декодирование один раз, split на все уровни"""
+    split = "".join(f"[s{i}]" for i in range(len(rungs)))
+    filters = [f"[0:v]split={len(rungs)}{split}"]
+    filters += [f"[s{i}]scale={r['width']}:{r['height']}[v{i}]" for i, r in enumerate(rungs)]
+
+    args = ["-i", source, "-filter_complex", ";".join(filters)]
+    for i in range(len(rungs)):
+        args += ["-map", f"[v{i}]"]
+        if has_audio:
+            args += ["-map", "0:a:0"]
+
+    args += [
+        "-c:v", "libx264", "-preset", getattr(settings, "HLS_X264_PRESET", "veryfast"),
+        "-pix_fmt", "yuv420p", "-sc_threshold", "0",
+        # Ключевые кадры на границах сегментов — переключение качества без артефактов
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+    ]
+    for i, r in enumerate(rungs):
+        rate = r["video_bitrate"]
+        args += [f"-b:v:{i}", f"{rate}k", f"-maxrate:v:{i}", f"{int(rate * 1.07)}k", f"-bufsize:v:{i}", f"{int(rate * 1.5)}k"]
+    if has_audio:
+        args += ["-c:a", "aac", "-ac", "2"]
+        for i, r in enumerate(rungs):
+            args += [f"-b:a:{i}", f"{r['audio_bitrate']}k"]
+
+    stream_map = " ".join(
+        f"v:{i},a:{i},name:{r['name']}" if has_audio else f"v:{i},name:{r['name']}"
+        for i, r in enumerate(rungs)
+    )
+    args += [
+        "-f", "hls",
+        "-hls_time", str(segment_seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(out_dir, "%v", "seg_%05d.ts"),
+        "-master_pl_name", MASTER_PLAYLIST,
+        "-var_stream_map", stream_map,
+        os.path.join(out_dir, "%v", "index.m3u8"),
+    ]
+    return args
+
+
+def package(source, target_dir):
+    """
+    Собирает HLS исходника source в target_dir (через временный каталог и
+    переименование). Возвращает описание лесенки.
+    """
+    info = ffmpeg.probe(source)
+    if not info["height"]:
+        raise ffmpeg.FFmpegError("в файле нет видеопотока")
+
+    rungs = select_ladder(info["width"], info["height"])
+    segment_seconds = getattr(settings, "HLS_SEGMENT_SECONDS", 6)
+
+    tmp_dir = f"{target_dir}.tmp-{uuid.uuid4().hex}"
+    for rung in rungs:
+        os.makedirs(os.path.join(tmp_dir, rung["name"]), exist_ok=True)
+    try:
+        ffmpeg.run(build_args(source, tmp_dir, rungs, info["has_audio"], segment_seconds))
+        ladder = {
+            "duration": info["duration"],
+            "segment_seconds": segment_seconds,
+            "renditions": [
+                {
+                    "name": r["name"], "width": r["width"], "height": r["height"],
+                    "bandwidth": r["bandwidth"], "playlist": f"{r['name']}/index.m3u8",
+                }
+                for r in rungs
+            ],
+        }
+        with open(os.path.join(tmp_dir, LADDER_FILE), "w") as f:
+            json.dump(ladder, f)
+        try:
+            os.replace(tmp_dir, target_dir)
+        except OSError:
+            # Такое же содержимое уже упаковано параллельно
+            if not os.path.exists(os.path.join(target_dir, LADDER_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return ladder
+
+
+def package_hls(file_obj, key):
+    """
+    Обработчик ingest для видео. Одинаковое содержимое упаковывается один раз:
+    каталог HLS общий для всех File с этим blob'ом.
+    """
+    from .ingest import lock_current
+
+    target_dir = hls_dir(key)
+    ladder_path = os.path.join(target_dir, LADDER_FILE)
+    if os.path.exists(ladder_path):
+        with open(ladder_path) as f:
+            ladder = json.load(f)
+    else:
+        ladder = package(file_obj.file.path, target_dir)
+
+    with transaction.atomic():
+        if lock_current(file_obj.pk, key) is None:
+            return {}
+        Rendition.objects.filter(file=file_obj).delete()
+        Rendition.objects.bulk_create([
+            Rendition(file=file_obj, **rendition) for rendition in ladder["renditions"]
+        ])
+
+    return {
+        "master": MASTER_PLAYLIST,
+        "version": key[:16],
+        "duration": ladder["duration"],
+        "renditions": len(ladder["renditions"]),
+    }
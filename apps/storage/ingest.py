@@ -0,0 +1,87 @@
+"""
+Обработка файла после загрузки: производные артефакты по типу файла
+(HLS для видео и т.д.) в фоновом пуле "media"
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from .models import File, Rendition
+from .blobs import derived_key
+from .jobs import submit
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+def get_processors(file_type):
+    """
+    Обработчики для типа файла из MEDIA_INGEST_PROCESSORS:
+    {"video": {"hls": "storage.hls.package_hls"}} → {"hls": <функция>}
+    """
+    processors = getattr(settings, "MEDIA_INGEST_PROCESSORS", {}).get(file_type, {})
+    return {name: import_string(path) for name, path in processors.items()}
+
+
+def lock_current(file_id, key):
+    """
+    Блокирует строку File, если её содержимое всё ещё соответствует key.
+    Вызывать внутри transaction.atomic(); None — файл удалён или заменён,
+    результат обработки старого содержимого записывать не нужно.
+    """
+    file_obj = File.objects.select_for_update().filter(pk=file_id).first()
+    if file_obj is None or derived_key(file_obj) != key:
+        return None
+    return file_obj
+
+
+def set_artifact(file_id, key, name, **data):
+    """Записывает состояние артефакта name; False — содержимое файла уже другое"""
+    with transaction.atomic():
+        file_obj = lock_current(file_id, key)
+        if file_obj is None:
+            return False
+        file_obj.artifacts = {**file_obj.artifacts, name: data}
+        file_obj.save(update_fields=["artifacts", "updated_at"])
+    return True
+
+
+# ==============================
+# 🔹 Постановка в очередь и выполнение
+# ==============================
+def enqueue_ingest(file_obj):
+    """
+    Сбрасывает артефакты прежнего содержимого и ставит обработку в очередь
+    (после коммита). Вызывать после создания File и после замены содержимого.
+    """
+    processors = getattr(settings, "MEDIA_INGEST_PROCESSORS", {}).get(file_obj.file_type, {})
+    Rendition.objects.filter(file=file_obj).delete()
+    file_obj.artifacts = {name: {"status": STATUS_QUEUED} for name in processors}
+    file_obj.save(update_fields=["artifacts", "updated_at"])
+    if processors:
+        submit(run_ingest, file_obj.pk, derived_key(file_obj), pool="media")
+
+
+def run_ingest(file_id, key, only=None):
+    """Выполняет обработчики по очереди; ошибка одного не мешает остальным"""
+    file_obj = File.objects.filter(pk=file_id).first()
+    if file_obj is None or derived_key(file_obj) != key:
+        return
+
+    for name, processor in get_processors(file_obj.file_type).items():
+        if only and name not in only:
+            continue
+        if not set_artifact(file_id, key, name, status=STATUS_PROCESSING):
+            return
+        try:
+            data = processor(file_obj, key) or {}
+        except Exception as e:
+            logger.exception("Обработка %s для файла %s завершилась с ошибкой", name, file_id)
+            set_artifact(file_id, key, name, status=STATUS_FAILED, error=str(e)[-500:])
+            continue
+        set_artifact(file_id, key, name, status=STATUS_READY, **data)
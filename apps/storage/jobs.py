@@ -0,0 +1,143 @@
+"""
+Локальный пул фоновых задач (без внешнего брокера) и финализация загрузок
+"""
+import os
+import logging
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .models import File, UploadJob
+from .uploads import get_upload_dir, commit_target, merge_chunks, reopen_session, ChunkHasher
+from .blobs import incoming_path, store_blob
+
+
+logger = logging.getLogger(__name__)
+
+# Пулы задач и настройки с числом потоков. Долгая обработка медиа идёт
+# в отдельном пуле, чтобы не задерживать сборку загруженных файлов;
+# удаление с диска — в своём, одним потоком, который разбирает очередь пачками
+POOLS = {
+    "finalize": ("UPLOAD_FINALIZE_WORKERS", 2),
+    "media": ("MEDIA_INGEST_WORKERS", 1),
+    "purge": ("PURGE_WORKERS", 1),
+}
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def get_executor(pool="finalize"):
+    with _executor_lock:
+        if pool not in _executors:
+            setting, default = POOLS[pool]
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=getattr(settings, setting, default),
+                thread_name_prefix=f"storage-{pool}",
+            )
+        return _executors[pool]
+
+
+def _run(fn, *args, **kwargs):
+    # Потоки пула переиспользуются — соединения с БД закрываем сами
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Фоновая задача %s завершилась с ошибкой", getattr(fn, "__name__", fn))
+        raise
+    finally:
+        close_old_connections()
+
+
+def submit(fn, *args, pool="finalize", **kwargs):
+    """Ставит задачу в пул после коммита текущей транзакции"""
+    transaction.on_commit(lambda: get_executor(pool).submit(_run, fn, *args, **kwargs))
+
+
+def detect_file_type(path):
+    mime_type, _ = mimetypes.guess_type(path)
+    file_type = "other"
+    if mime_type:
+        if mime_type.startswith("audio"):
+            file_type = "audio"
+        elif mime_type.startswith("video"):
+            file_type = "video"
+        elif mime_type.startswith("image"):
+            file_type = "image"
+        elif mime_type in ["application/pdf", "text/plain"]:
+            file_type = "document"
+    return file_type
+
+
+# ==============================
+# 🔹 Финализация загрузки по чанкам
+# ==============================
+def enqueue_finalize(job, hasher=None):
+    submit(run_finalize, job.pk, hasher)
+
+
+def run_finalize(job_id, hasher=None):
+    job = UploadJob.objects.select_related("session", "folder").get(pk=job_id)
+    job.status = UploadJob.STATUS_MERGING
+    job.save(update_fields=["status", "updated_at"])
+
+    try:
+        file_obj = finalize_session(job.session, job.folder, job.file_name, hasher)
+    except Exception as e:
+        job.status = UploadJob.STATUS_FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "updated_at"])
+        # Сессию снова открываем с чистой картой чанков: полученные уже
+        # израсходованы сборкой, клиент отправляет файл заново
+        reopen_session(job.session)
+        raise
+
+    job.status = UploadJob.STATUS_DONE
+    job.file = file_obj
+    job.save(update_fields=["status", "file", "updated_at"])
+
+    # Производные артефакты (HLS и т.п.) — отдельной задачей в пуле media
+    from .ingest import enqueue_ingest
+    enqueue_ingest(file_obj)
+
+
+def finalize_session(session, folder, file_name, hasher=None):
+    """
+    Собирает итоговый файл из чанков сессии, кладёт его в хранилище blob'ов
+    (одинаковое содержимое хранится один раз) и создаёт запись File
+    """
+    upload_dir = get_upload_dir(session.upload_id)
+    assembled_path = incoming_path()
+
+    if session.is_preallocated:
+        # 🔹 Чанки уже лежат на своих местах — только fsync и переименование
+        commit_target(session.upload_id, assembled_path)
+    else:
+        # 🔹 Сортировка chunk_0, chunk_1, ...
+        chunk_files = sorted(
+            [f for f in os.listdir(upload_dir) if f.startswith("chunk_")],
+            key=lambda x: int(x.split("_")[-1])
+        )
+        # 🔹 Склейка (копирование внутри ядра) и очистка временных файлов
+        merge_chunks(upload_dir, chunk_files, assembled_path)
+
+    # 🔹 SHA-256: чанки, пришедшие по порядку, уже посчитаны при загрузке
+    sha256 = (hasher or ChunkHasher()).finish(assembled_path)
+    if session.sha256 and session.sha256 != sha256:
+        os.remove(assembled_path)
+        raise ValueError(f"SHA-256 файла {sha256} не совпадает с заявленным {session.sha256}")
+
+    with transaction.atomic():
+        blob = store_blob(assembled_path, sha256, os.path.splitext(file_name)[1])
+
+        # 🔹 Создание записи в модели File
+        return File.objects.create(
+            folder=folder,
+            name=file_name,
+            file=blob.file.name,
+            blob=blob,
+            file_type=detect_file_type(file_name),
+            size=blob.size,
+        )
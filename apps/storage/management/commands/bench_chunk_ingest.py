@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест приёма чанков: для каждого уровня параллелизма загружает "
+        "файл в одну сессию и печатает суммарную пропускную способность"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Адрес запущенного сервера")
+        parser.add_argument("--token", required=True, help="JWT access-токен пользователя с ролью Admin/SuperUser")
+        parser.add_argument("--chunks", type=int, default=64)
+        parser.add_argument("--chunk-mb", type=int, default=4)
+        parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Уровни параллелизма через запятую")
+        parser.add_argument(
+            "--legacy", action="store_true",
+            help="Сессии без total_size/chunk_size (чанки отдельными файлами)",
+        )
+
+    def handle(self, *args, **options):
+        self.base_url = options["url"].rstrip("/") + "/storage/api/v3/"
+        self.token = options["token"]
+        chunk_size = options["chunk_mb"] * 1024 * 1024
+        chunks = options["chunks"]
+        payload = os.urandom(chunk_size)
+        total_mb = chunks * options["chunk_mb"]
+
+        self.stdout.write(f"{chunks} чанков × {options['chunk_mb']} МБ = {total_mb} МБ на прогон")
+        for concurrency in [int(c) for c in options["concurrency"].split(",")]:
+            init = {"file_name": "bench_ingest.bin", "total_chunks": chunks}
+            if not options["legacy"]:
+                init.update({"total_size": chunks * chunk_size, "chunk_size": chunk_size})
+            upload_id = self._request("chunk_init/", json.dumps(init).encode(), "application/json")["upload_id"]
+
+            def send(index):
+                self._request(
+                    "chunk_upload/", payload, "application/octet-stream",
+                    {"X-Upload-ID": upload_id, "X-Chunk-Index": str(index)},
+                )
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(send, range(chunks)))
+            elapsed = time.perf_counter() - started
+
+            missing = self._request(f"chunk_missing/{upload_id}/")
+            if missing["received_chunks"] != chunks or missing["missing"]:
+                raise CommandError(f"Потеряны чанки при параллелизме {concurrency}: {missing}")
+            self._request("chunk_complete/", json.dumps({"upload_id": upload_id}).encode(), "application/json")
+
+            self.stdout.write(
+                f"параллелизм {concurrency:>3}: {elapsed:8.3f} с  {total_mb / elapsed:9.1f} МБ/с"
+            )
+
+    def _request(self, path, data=None, content_type=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=data, method="POST" if data is not None else "GET")
+        request.add_header("Authorization", f"Bearer {self.token}")
+        if content_type:
+            request.add_header("Content-Type", content_type)
+        for key, value in (headers or {}).items():
+            request.add_header(key, value)
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
@@ -0,0 +1,65 @@
+import os
+import time
+import shutil
+import tempfile
+import tracemalloc
+from django.core.management.base import BaseCommand
+from storage import uploads
+
+
+def legacy_merge(upload_dir, chunk_files, final_path):
+    """Прежняя склейка из ChunkCompleteAPIView: каждый чанк целиком читается в память"""
+    with open(final_path, "wb") as outfile:
+        for chunk in chunk_files:
+            with open(os.path.join(upload_dir, chunk), "rb") as infile:
+                outfile.write(infile.read())
+
+
+class Command(BaseCommand):
+    help = "Сравнивает прежнюю склейку чанков (read/write) с копированием внутри ядра"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunks", type=int, default=8)
+        parser.add_argument("--chunk-mb", type=int, default=64)
+        parser.add_argument("--dir", default=None, help="Каталог для временных файлов (по умолчанию системный tmp)")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_mb"] * 1024 * 1024
+        chunk_files = [f"chunk_{i}" for i in range(options["chunks"])]
+        total_mb = options["chunks"] * options["chunk_mb"]
+        self.stdout.write(f"{options['chunks']} чанков × {options['chunk_mb']} МБ = {total_mb} МБ")
+
+        root = tempfile.mkdtemp(prefix="bench_merge_", dir=options["dir"])
+        try:
+            source_dir = os.path.join(root, "source")
+            os.makedirs(source_dir)
+            block = os.urandom(1024 * 1024)
+            for name in chunk_files:
+                with open(os.path.join(source_dir, name), "wb") as f:
+                    for _ in range(options["chunk_mb"]):
+                        f.write(block)
+
+            def run(label, merge):
+                upload_dir = os.path.join(root, "temp_uploads", label)
+                shutil.copytree(source_dir, upload_dir)
+                final_path = os.path.join(root, f"{label}.bin")
+
+                tracemalloc.start()
+                started = time.perf_counter()
+                merge(upload_dir, final_path)
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                assert os.path.getsize(final_path) == chunk_size * len(chunk_files)
+                os.remove(final_path)
+                shutil.rmtree(upload_dir, ignore_errors=True)
+                self.stdout.write(
+                    f"{label:<8} {elapsed:8.3f} с  {total_mb / elapsed:9.1f} МБ/с  "
+                    f"пик памяти Python {peak / 1024 / 1024:8.2f} МБ"
+                )
+
+            run("legacy", lambda upload_dir, final_path: legacy_merge(upload_dir, chunk_files, final_path))
+            run("kernel", lambda upload_dir, final_path: uploads.merge_chunks(upload_dir, chunk_files, final_path))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from storage.blobs import derived_key
+from storage.ingest import STATUS_READY, get_processors, run_ingest
+from storage.models import File
+
+
+class Command(BaseCommand):
+    help = "Строит производные артефакты (HLS и т.д.) для уже загруженных файлов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--type", dest="file_type", default=None, help="Только файлы этого типа (video, ...)")
+        parser.add_argument("--only", nargs="*", default=None, help="Только эти артефакты (hls, ...)")
+        parser.add_argument("--force", action="store_true", help="Обработать и файлы с готовыми артефактами")
+
+    def handle(self, *args, **options):
+        files = File.objects.order_by("created_at")
+        if options["file_type"]:
+            files = files.filter(file_type=options["file_type"])
+
+        processed = 0
+        for file_obj in files.iterator():
+            names = set(get_processors(file_obj.file_type))
+            if options["only"]:
+                names &= set(options["only"])
+            if not options["force"]:
+                names = {n for n in names if file_obj.artifacts.get(n, {}).get("status") != STATUS_READY}
+            if not names:
+                continue
+
+            self.stdout.write(f"{file_obj.name}: {', '.join(sorted(names))}")
+            run_ingest(file_obj.pk, derived_key(file_obj), only=names)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано файлов: {processed}"))
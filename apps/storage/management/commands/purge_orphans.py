@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from storage.purge import sweep_orphans
+
+
+class Command(BaseCommand):
+    help = "Удаляет с диска файлы blob'ов и производные артефакты, на которые больше нет записей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-age-hours", type=float, default=24,
+                            help="Не трогать то, что менялось за последние N часов (по умолчанию 24)")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["min_age_hours"])
+        result = sweep_orphans(cutoff, dry_run=options["dry_run"])
+        prefix = "Будет удалено" if options["dry_run"] else "Удалено"
+        self.stdout.write(
+            f"{prefix}: файлов blob'ов {result['blobs']}, каталогов производных {result['derived']}"
+        )
@@ -0,0 +1,35 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from storage.reaper import reap_upload_sessions, temp_upload_usage
+
+
+class Command(BaseCommand):
+    help = "Удаляет брошенные сессии загрузки по чанкам и их временные файлы"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age-hours", type=float, default=None,
+                            help="Максимальный возраст сессии (по умолчанию UPLOAD_SESSION_MAX_AGE)")
+        parser.add_argument("--idle-hours", type=float, default=None,
+                            help="Максимальный простой сессии (по умолчанию UPLOAD_SESSION_IDLE_TIMEOUT)")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено")
+
+    def handle(self, *args, **options):
+        max_age = options["max_age_hours"]
+        idle = options["idle_hours"]
+        result = reap_upload_sessions(
+            max_age=timedelta(hours=max_age) if max_age is not None else None,
+            idle_timeout=timedelta(hours=idle) if idle is not None else None,
+            dry_run=options["dry_run"],
+        )
+        prefix = "Будет удалено" if options["dry_run"] else "Удалено"
+        self.stdout.write(
+            f"{prefix}: сессий {result['sessions']}, {result['bytes']} байт чанков, "
+            f"осиротевших временных файлов {result['orphan_dirs']}, "
+            f"зависших задач сборки {result['stalled_jobs']}"
+        )
+
+        usage = temp_upload_usage()
+        self.stdout.write(
+            f"Открытых сессий: {usage['sessions']}, на диске {usage['received_bytes']} байт, "
+            f"зарезервировано {usage['reserved_bytes']} байт (квота {usage['quota_bytes'] or 'не задана'})"
+        )
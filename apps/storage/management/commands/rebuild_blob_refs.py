@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from storage.blobs import rebuild_blob_refs
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает ссылки на blob'ы по записям File и удаляет blob'ы без ссылок"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только показать число расхождений")
+
+    def handle(self, *args, **options):
+        fixed = rebuild_blob_refs(dry_run=options["dry_run"])
+        prefix = "Расходятся ссылки blob'ов" if options["dry_run"] else "Исправлены ссылки blob'ов"
+        self.stdout.write(f"{prefix}: {fixed}")
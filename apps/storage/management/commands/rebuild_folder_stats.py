@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from storage.stats import rebuild_folder_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает итоги папок (объём, число файлов и под-папок) и исправляет расхождения"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только показать число расхождений")
+
+    def handle(self, *args, **options):
+        fixed = rebuild_folder_stats(dry_run=options["dry_run"])
+        prefix = "Расходятся итоги папок" if options["dry_run"] else "Исправлены итоги папок"
+        self.stdout.write(f"{prefix}: {fixed}")
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0002_file_viewed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileuploadsession',
+            name='chunk_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileuploadsession',
+            name='total_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='file_type',
+            field=models.CharField(choices=[('audio', 'audio'), ('video', 'video'), ('document', 'document'), ('image', 'image')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0004_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileuploadsession',
+            name='received_bitmap',
+            field=models.BinaryField(blank=True, default=bytes),
+        ),
+    ]
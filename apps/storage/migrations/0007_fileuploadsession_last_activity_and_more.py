@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0006_blob_fileuploadsession_sha256_file_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileuploadsession',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='fileuploadsession',
+            name='received_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='fileuploadsession',
+            index=models.Index(fields=['is_complete', 'last_activity'], name='storage_fil_is_comp_db4603_idx'),
+        ),
+    ]
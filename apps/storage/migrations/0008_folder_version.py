@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0007_fileuploadsession_last_activity_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0008_folder_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='artifacts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='Rendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('bandwidth', models.PositiveIntegerField()),
+                ('playlist', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='storage.file')),
+            ],
+            options={
+                'ordering': ['file', '-bandwidth'],
+                'constraints': [models.UniqueConstraint(fields=('file', 'name'), name='unique_rendition_name')],
+            },
+        ),
+    ]
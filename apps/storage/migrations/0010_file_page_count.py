@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0009_file_artifacts_rendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
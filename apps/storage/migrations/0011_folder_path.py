@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    """Пути существующих папок — по уровням дерева, от корней вниз"""
+    Folder = apps.get_model('storage', 'Folder')
+    paths = {}
+    level = list(Folder.objects.filter(parent__isnull=True))
+    while level:
+        for folder in level:
+            folder.path = f"{paths.get(folder.parent_id, '/')}{folder.pk.hex}/"
+            paths[folder.pk] = folder.path
+        Folder.objects.bulk_update(level, ['path'], batch_size=500)
+        level = list(Folder.objects.filter(parent_id__in=[folder.pk for folder in level]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0010_file_page_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=2048),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
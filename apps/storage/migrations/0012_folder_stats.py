@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+import uuid
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_stats(apps, schema_editor):
+    """Итоги существующих папок: свёртка сумм файлов по цепочкам предков"""
+    Folder = apps.get_model('storage', 'Folder')
+    File = apps.get_model('storage', 'File')
+
+    def path_ids(path):
+        return [uuid.UUID(part) for part in path.strip('/').split('/') if part]
+
+    folders = {folder.pk: folder for folder in Folder.objects.all()}
+    for folder in folders.values():
+        for ancestor in path_ids(folder.path)[:-1]:
+            if ancestor in folders:
+                folders[ancestor].subfolder_count += 1
+
+    rows = File.objects.filter(folder__isnull=False).values('folder_id').annotate(size=Sum('size'), count=Count('pk'))
+    for row in rows:
+        folder = folders.get(row['folder_id'])
+        for ancestor in path_ids(folder.path) if folder else []:
+            if ancestor in folders:
+                folders[ancestor].total_size += row['size'] or 0
+                folders[ancestor].file_count += row['count']
+
+    Folder.objects.bulk_update(folders.values(), ['total_size', 'file_count', 'subfolder_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0011_folder_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='file_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='subfolder_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='total_size',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,8 @@ import uuid
 import secrets
 import os
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 import base64
 import secrets
@@ -80,6 +81,11 @@ def generate_secure_token(length=10):
     return token.rstrip('=')
 
 
+def path_ids(path):
+    """id папок из материализованного пути "/<id>/<id>/", от корня"""
+    return [uuid.UUID(part) for part in path.strip("/").split("/") if part]
+
+
 class Folder(models.Model):
     """
     Модель папки (иерархическая структура)
@@ -96,14 +102,100 @@ class Folder(models.Model):
     )
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Растёт при любом изменении в поддереве папки — из неё строится ETag
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Материализованный путь: id предков и самой папки, "/<id>/<id>/".
+    # Поддерево — один запрос path__startswith по индексу, предки — из строки
+    path = models.CharField(max_length=2048, db_index=True, default="", editable=False)
+    # Итоги по всему поддереву — обновляются по цепочке предков при каждом
+    # изменении (сигналы), пересчитываются командой rebuild_folder_stats
+    total_size = models.BigIntegerField(default=0, editable=False)
+    file_count = models.IntegerField(default=0, editable=False)
+    subfolder_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['name']
 
+    def save(self, *args, **kwargs):
+        """
+        Пересчитывает path и в той же транзакции одним UPDATE переписывает
+        пути всего поддерева, если папку переместили
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "parent" not in update_fields:
+            return super().save(*args, **kwargs)
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "path"}
+
+        with transaction.atomic():
+            old_path = self.path
+            parent_path = "/"
+            if self.parent_id is not None:
+                # Путь родителя — из БД внутри транзакции, а не из объекта в памяти
+                parent_path = Folder.objects.filter(pk=self.parent_id).values_list("path", flat=True).get()
+                if old_path and parent_path.startswith(old_path):
+                    raise ValueError("Нельзя переместить папку внутрь самой себя или её под-папки")
+            self.path = f"{parent_path}{self.pk.hex}/"
+            # До super().save(): обработчики post_save уже видят новые пути поддерева
+            if old_path and old_path != self.path:
+                Folder.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(models.Value(self.path), Substr("path", len(old_path) + 1),
+                                output_field=models.CharField())
+                )
+            super().save(*args, **kwargs)
+
+    def ancestor_ids(self):
+        """id предков от корня до родителя — из path, без запросов"""
+        return path_ids(self.path)[:-1]
+
+    def ancestors(self):
+        """Предки от корня до родителя (для хлебных крошек) — один запрос"""
+        ids = self.ancestor_ids()
+        folders = Folder.objects.in_bulk(ids)
+        return [folders[pk] for pk in ids if pk in folders]
+
+    def descendants(self):
+        """Все под-папки на любой глубине — один запрос по индексу path"""
+        return Folder.objects.filter(path__startswith=self.path).exclude(pk=self.pk)
+
+    def is_inside(self, other):
+        """Лежит ли папка внутри other (или это она сама)"""
+        return self.path.startswith(other.path)
+
     def __str__(self):
         return self.name
 
 
+class Blob(models.Model):
+    """
+    Физический файл, хранящийся один раз по SHA-256 содержимого.
+    На один blob может ссылаться несколько записей File.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to='blobs/')
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} ссылок)"
+
+
+class BlobAlias(models.Model):
+    """
+    Другой SHA-256 того же содержимого: исходный файл, который сервер
+    перепаковал (например, MP4 с moov в конце). Загрузка исходника по
+    sha256 прикрепляется к перепакованному blob'у без передачи байтов.
+    Удаляется вместе с blob'ом.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    blob = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name='aliases')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} → {self.blob_id[:12]}"
+
+
 class File(models.Model):
     """
     Модель файла (аудио, видео, документы и т.д.)
@@ -126,18 +218,34 @@ class File(models.Model):
         null=True,
         blank=True
     )
+    # Содержимое из хранилища blob'ов; у старых файлов не заполнено
+    blob = models.ForeignKey(
+        Blob,
+        on_delete=models.PROTECT,
+        related_name='files',
+        null=True,
+        blank=True
+    )
     file_type = models.CharField(max_length=10, choices=FILE_TYPES)
     size = models.BigIntegerField(null=True, blank=True)
+    # Число страниц PDF — считается один раз при первом просмотре превью
+    page_count = models.PositiveIntegerField(null=True, blank=True)
     viewed = models.BooleanField(default=False)  # 👈 добавляем флаг "уже просмотрен"
+    # Состояние производных артефактов (HLS и т.д.): {"hls": {"status": "ready", ...}}
+    artifacts = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Постраничный список all_files: ключ (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
         """Автоматически вычисляем размер файла при сохранении"""
-        if self.file and not self.size:
+        if self.file and self.size is None:
             try:
                 self.size = self.file.size
             except Exception:
@@ -153,17 +261,149 @@ class File(models.Model):
         return f"{self.name} ({self.file_type})"
 
 
+class Rendition(models.Model):
+    """
+    Один уровень HLS-лесенки видеофайла: свой плейлист и сегменты
+    """
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=32)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    # Пиковый битрейт (бит/с) — атрибут BANDWIDTH в мастер-плейлисте
+    bandwidth = models.PositiveIntegerField()
+    # Путь плейлиста относительно каталога HLS файла
+    playlist = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['file', '-bandwidth']
+        constraints = [
+            models.UniqueConstraint(fields=['file', 'name'], name='unique_rendition_name'),
+        ]
+
+    def __str__(self):
+        return f"{self.file.name} {self.name}"
+
+
 class FileUploadSession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     folder = models.ForeignKey(Folder, on_delete=models.CASCADE, null=True, blank=True)
     upload_id = models.CharField(max_length=100, unique=True, db_index=True)
     total_chunks = models.IntegerField()
     received_chunks = models.IntegerField(default=0)
+    # Бит i выставлен, если чанк i получен (младший бит байта — меньший номер)
+    received_bitmap = models.BinaryField(default=bytes, blank=True)
+    # Если заданы — чанки пишутся сразу в предвыделенный целевой файл по смещению
+    total_size = models.BigIntegerField(null=True, blank=True)
+    chunk_size = models.BigIntegerField(null=True, blank=True)
+    # SHA-256, заявленный клиентом в chunk_init; сверяется при сборке
+    sha256 = models.CharField(max_length=64, null=True, blank=True)
     file_name = models.CharField(max_length=255, null=True, blank=True)
     is_complete = models.BooleanField(default=False)
+    # Учёт временных данных: сколько байт чанков уже на диске и когда приходил последний чанк
+    received_bytes = models.BigIntegerField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_complete', 'last_activity']),
+        ]
+
     def __str__(self):
         return f"{self.file_name or 'unnamed'} ({self.received_chunks}/{self.total_chunks})"
 
+    @property
+    def reserved_bytes(self):
+        """Место на диске, которое займёт сессия: у предвыделенного файла — весь размер"""
+        return self.total_size if self.is_preallocated else self.received_bytes
+
+    def has_chunk(self, chunk_index):
+        bitmap = bytes(self.received_bitmap or b'')
+        byte = chunk_index // 8
+        return byte < len(bitmap) and bool(bitmap[byte] & (1 << (chunk_index % 8)))
+
+    def mark_chunk(self, chunk_index):
+        """
+        Отмечает чанк полученным. Возвращает False, если он уже был отмечен —
+        повторная отправка чанка не увеличивает received_chunks.
+        """
+        bitmap = bytearray(self.received_bitmap or b'')
+        byte, bit = divmod(chunk_index, 8)
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte + 1 - len(bitmap)))
+        if bitmap[byte] & (1 << bit):
+            return False
+        bitmap[byte] |= 1 << bit
+        self.received_bitmap = bytes(bitmap)
+        self.received_chunks += 1
+        return True
+
+    def missing_ranges(self):
+        """Недостающие чанки в виде списка диапазонов [start, end] включительно"""
+        bitmap = bytes(self.received_bitmap or b'')
+        ranges = []
+        start = None
+        for byte in range((self.total_chunks + 7) // 8):
+            value = bitmap[byte] if byte < len(bitmap) else 0
+            # Целые байты «все получены» / «все пропущены» не разбираем по битам
+            if (value == 0xFF and start is None) or (value == 0 and start is not None):
+                continue
+            for bit in range(min(8, self.total_chunks - byte * 8)):
+                index = byte * 8 + bit
+                received = value & (1 << bit)
+                if not received and start is None:
+                    start = index
+                elif received and start is not None:
+                    ranges.append([start, index - 1])
+                    start = None
+        if start is not None:
+            ranges.append([start, self.total_chunks - 1])
+        return ranges
+
+    @property
+    def is_preallocated(self):
+        return bool(self.total_size and self.chunk_size)
+
+    def get_chunk_span(self, chunk_index):
+        """Смещение и ожидаемая длина чанка в целевом файле"""
+        offset = chunk_index * self.chunk_size
+        return offset, min(self.chunk_size, self.total_size - offset)
+
+
+
+
+class UploadJob(models.Model):
+    """
+    Фоновая финализация загрузки: склейка чанков, определение типа и создание File
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_MERGING = 'merging'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'queued'),
+        (STATUS_MERGING, 'merging'),
+        (STATUS_DONE, 'done'),
+        (STATUS_FAILED, 'failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(FileUploadSession, on_delete=models.CASCADE, related_name='jobs')
+    folder = models.ForeignKey(Folder, on_delete=models.SET_NULL, null=True, blank=True)
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    file = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def is_active(self):
+        return self.status in (self.STATUS_QUEUED, self.STATUS_MERGING)
+
+    def __str__(self):
+        return f"{self.file_name} [{self.status}]"
@@ -0,0 +1,71 @@
+"""
+Постраничная выдача по ключу (keyset): следующая страница начинается
+строго после последней записи предыдущей, без OFFSET — скорость не
+зависит ни от номера страницы, ни от размера каталога
+"""
+import uuid
+import base64
+from datetime import datetime
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Сначала новые: порядок (-created_at, -id), курсор — created_at и id
+    последней записи. ?limit — размер страницы, ?cursor — из поля next.
+    Некорректные значения — ValueError.
+    """
+    page_size = 100
+    max_page_size = 1000
+    ordering = ("-created_at", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_limit(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        # Одна лишняя запись — признак того, что следующая страница есть
+        page = list(queryset[:limit + 1])
+        self.next_cursor = self.encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return page[:limit]
+
+    def get_limit(self, request):
+        limit = request.query_params.get("limit")
+        if limit in (None, ""):
+            return self.page_size
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("limit должен быть целым числом")
+        if limit < 1:
+            raise ValueError("limit должен быть положительным")
+        return min(limit, self.max_page_size)
+
+    def encode_cursor(self, obj):
+        raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, pk = raw.split("|")
+            return datetime.fromisoformat(created_at), uuid.UUID(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Некорректный cursor")
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, "cursor", self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
@@ -0,0 +1,27 @@
+"""
+Рендер страниц PDF в PNG. Выполняется в дочерних процессах пула,
+поэтому модуль не импортирует Django
+"""
+import os
+import uuid
+import shutil
+from pdf2image import convert_from_path
+
+
+def render_pdf_pages(source, target_dir, first, last, dpi):
+    """
+    Рендерит страницы first..last одним вызовом pdftoppm прямо в файлы
+    (без картинок в памяти) и атомарно кладёт их в target_dir как page_N.png
+    """
+    tmp_dir = os.path.join(target_dir, f"tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        paths = convert_from_path(
+            source, dpi=dpi, first_page=first, last_page=last,
+            output_folder=tmp_dir, output_file="page", fmt="png", paths_only=True,
+        )
+        for page, path in zip(range(first, last + 1), sorted(paths)):
+            os.replace(path, os.path.join(target_dir, f"page_{page}.png"))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return last - first + 1
@@ -0,0 +1,187 @@
+"""
+Превью страниц PDF: число страниц считается один раз, страницы
+рендерятся лениво, только те, которых ещё нет в кэше, и в пуле процессов
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from pdf2image import pdfinfo_from_path
+from .blobs import derived_dir
+from .pdf_render import render_pdf_pages
+
+
+CONTENT_TYPES = {".png": "image/png"}
+
+
+def previews_dir(key):
+    return os.path.join(derived_dir(key), "pdf")
+
+
+def page_path(key, page):
+    return os.path.join(previews_dir(key), f"page_{page}.png")
+
+
+def is_pdf(file_obj):
+    return file_obj.file.name.lower().endswith(".pdf")
+
+
+def get_page_count(file_obj):
+    """Число страниц: из File.page_count, а при первом обращении — из pdfinfo"""
+    if file_obj.page_count is None:
+        file_obj.page_count = int(pdfinfo_from_path(file_obj.file.path)["Pages"])
+        file_obj.save(update_fields=["page_count", "updated_at"])
+    return file_obj.page_count
+
+
+def parse_page_range(params, page_count):
+    """
+    Диапазон страниц из ?page=N или ?first_page=A&last_page=B.
+    Возвращает (first, last, задан_ли_диапазон); ValueError — некорректные значения.
+    """
+    page = params.get("page")
+    first = params.get("first_page")
+    last = params.get("last_page")
+    if page not in (None, ""):
+        first = last = page
+    if first in (None, "") and last in (None, ""):
+        return 1, page_count, False
+
+    try:
+        first = int(first) if first not in (None, "") else 1
+        last = int(last) if last not in (None, "") else page_count
+    except (TypeError, ValueError):
+        raise ValueError("Номера страниц должны быть целыми числами")
+    if not 1 <= first <= last <= page_count:
+        raise ValueError(f"Страницы должны быть в диапазоне 1..{page_count}")
+    return first, last, True
+
+
+def _runs(pages):
+    """Возрастающие номера страниц → непрерывные отрезки [a, b]"""
+    runs = []
+    for page in pages:
+        if runs and runs[-1][1] == page - 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return runs
+
+
+def missing_runs(key, first, last):
+    """Непрерывные отрезки страниц [a, b], которых нет в кэше"""
+    return _runs(p for p in range(first, last + 1) if not os.path.exists(page_path(key, p)))
+
+
+# ==============================
+# 🔹 Пул процессов и объединение одинаковых запросов
+# ==============================
+_pool = None
+_pool_lock = threading.Lock()
+# (ключ содержимого, страница) → Future рендера, в который она входит
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Пул процессов для рендера (CPU-bound): не больше PDF_RENDER_WORKERS
+    одновременных pdftoppm, по умолчанию — по числу ядер
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "PDF_RENDER_WORKERS", None) or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_pool(broken):
+    """Убирает сломанный пул (упал дочерний процесс) — следующий запрос создаст новый"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def _submit(*args):
+    """Ставит рендер в пул; сломанный пул заменяется новым и попытка повторяется"""
+    pool = get_pool()
+    try:
+        return pool, pool.submit(*args)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        pool = get_pool()
+        return pool, pool.submit(*args)
+
+
+def _forget(key, first, last, pool, future):
+    with _inflight_lock:
+        for page in range(first, last + 1):
+            if _inflight.get((key, page)) is future:
+                del _inflight[(key, page)]
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _reset_pool(pool)
+
+
+def ensure_pages(file_obj, key, first, last, wait=True):
+    """
+    Дорендеривает недостающие страницы диапазона; готовые не трогает.
+    Страницы, которые уже рендерятся по другому запросу, не ставятся
+    повторно — запрос ждёт тот же рендер.
+    """
+    futures = set()
+    submitted = []
+    with _inflight_lock:
+        todo = []
+        for run_first, run_last in missing_runs(key, first, last):
+            for page in range(run_first, run_last + 1):
+                future = _inflight.get((key, page))
+                if future is not None:
+                    futures.add(future)
+                else:
+                    todo.append(page)
+
+        target_dir = previews_dir(key)
+        if todo:
+            os.makedirs(target_dir, exist_ok=True)
+        dpi = getattr(settings, "PDF_PREVIEW_DPI", 200)
+        for run_first, run_last in _runs(todo):
+            pool, future = _submit(
+                render_pdf_pages, file_obj.file.path, target_dir, run_first, run_last, dpi
+            )
+            for page in range(run_first, run_last + 1):
+                _inflight[(key, page)] = future
+            submitted.append((run_first, run_last, pool, future))
+            futures.add(future)
+
+    # Вне блокировки: у уже завершённого Future колбэк вызывается сразу
+    # в этом же потоке, а _forget берёт ту же блокировку
+    for run_first, run_last, pool, future in submitted:
+        future.add_done_callback(
+            lambda f, a=run_first, b=run_last, p=pool: _forget(key, a, b, p, f)
+        )
+
+    if wait:
+        timeout = getattr(settings, "PDF_RENDER_TIMEOUT", 120)
+        for future in futures:
+            future.result(timeout=timeout)
+
+
+def warm_previews(file_obj, key):
+    """
+    Обработчик ingest для документов: число страниц и первые
+    PDF_PREVIEW_WARM_PAGES страниц готовы до первого просмотра
+    """
+    if not is_pdf(file_obj):
+        return {}
+    page_count = get_page_count(file_obj)
+    last = min(page_count, getattr(settings, "PDF_PREVIEW_WARM_PAGES", 3))
+    if last:
+        ensure_pages(file_obj, key, 1, last)
+    return {"page_count": page_count, "warmed_pages": last}
@@ -0,0 +1,154 @@
+"""
+Отложенное удаление содержимого с диска: записи в БД удаляются сразу,
+а unlink'и после коммита копятся в очереди и выполняются пачками в фоне
+"""
+import os
+import uuid
+import shutil
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .models import Blob, File
+
+
+logger = logging.getLogger(__name__)
+
+# Элементы очереди: (вид, значение). Вид "file" — имя в хранилище,
+# "derived" — ключ каталога производных артефактов. Имена blob'ов свои у
+# каждого появления содержимого, так что проверять, не загрузили ли его
+# заново, не нужно. Очередь живёт в памяти: потерянное при перезапуске
+# подбирает sweep_orphans (команда purge_orphans)
+FILE = "file"
+DERIVED = "derived"
+
+_pending = deque()
+_lock = threading.Lock()
+_draining = False
+
+
+def purge_later(items):
+    """Ставит удаление с диска в очередь после коммита текущей транзакции"""
+    items = list(items)
+    if items:
+        transaction.on_commit(lambda: _enqueue(items))
+
+
+def _enqueue(items):
+    global _draining
+    from .jobs import submit
+
+    with _lock:
+        _pending.extend(items)
+        if _draining:
+            return
+        _draining = True
+    submit(drain, pool="purge")
+
+
+def drain():
+    """Разбирает очередь пачками по PURGE_BATCH_SIZE, пока она не опустеет"""
+    global _draining
+    batch_size = getattr(settings, "PURGE_BATCH_SIZE", 500)
+    while True:
+        with _lock:
+            batch = [_pending.popleft() for _ in range(min(batch_size, len(_pending)))]
+            if not batch:
+                _draining = False
+                return
+        try:
+            purge_batch(batch)
+        except Exception:
+            logger.exception("Не удалось удалить с диска пачку из %s элементов", len(batch))
+
+
+def purge_batch(batch):
+    """Удаляет пачку файлов и каталогов производных артефактов"""
+    from .blobs import derived_dir
+
+    for kind, value in batch:
+        # Ошибка одного элемента не должна отменять остальную пачку
+        try:
+            if kind == DERIVED:
+                shutil.rmtree(derived_dir(value), ignore_errors=True)
+            else:
+                default_storage.delete(value)
+        except Exception:
+            logger.exception("Не удалось удалить с диска %s %s", kind, value)
+
+
+# ==============================
+# 🔹 Сиротские файлы
+# ==============================
+def _old_entries(root, cutoff_ts):
+    """Записи каталога root, не менявшиеся с cutoff_ts (свежие могут быть в работе)"""
+    if not os.path.isdir(root):
+        return []
+    return [e for e in os.scandir(root) if e.stat().st_mtime < cutoff_ts]
+
+
+def _subdirs(root):
+    if not os.path.isdir(root):
+        return []
+    return [e for e in os.scandir(root) if e.is_dir()]
+
+
+def sweep_orphans(cutoff, dry_run=False):
+    """
+    Удаляет с диска то, на что больше нет записей: файлы blobs/ab/cd/ без Blob
+    и каталоги derived/ без blob'а или старого файла с таким ключом.
+    Подбирает удаления, не дошедшие до очереди (перезапуск процесса).
+    Трогает только то, что не менялось с cutoff. Возвращает итоги.
+    """
+    from .blobs import blob_key, derived_dir
+
+    cutoff_ts = cutoff.timestamp()
+    result = {"blobs": 0, "derived": 0}
+
+    # 🔹 Файлы blob'ов: один запрос на каталог второго уровня
+    blobs_root = os.path.join(settings.MEDIA_ROOT, "blobs")
+    for first in _subdirs(blobs_root):
+        # blobs/incoming чистит reaper
+        if first.name == "incoming":
+            continue
+        for second in _subdirs(first.path):
+            prefix = f"blobs/{first.name}/{second.name}/"
+            known = set(Blob.objects.filter(file__startswith=prefix).values_list("file", flat=True))
+            for entry in _old_entries(second.path, cutoff_ts):
+                if entry.is_file() and prefix + entry.name not in known:
+                    result["blobs"] += 1
+                    if not dry_run:
+                        os.remove(entry.path)
+
+    # 🔹 Производные: ключ blob'а (<sha256>[-суффикс]) или file-<id> старого файла
+    batch_size = getattr(settings, "PURGE_BATCH_SIZE", 500)
+    keys = [e.name for e in _old_entries(os.path.join(settings.MEDIA_ROOT, "derived"), cutoff_ts)]
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        legacy = [key[len("file-"):] for key in batch if key.startswith("file-")]
+        alive = {
+            blob_key(name) for name in Blob.objects.filter(
+                pk__in={key[:64] for key in batch if not key.startswith("file-")}
+            ).values_list("file", flat=True)
+        }
+        alive |= {
+            f"file-{pk}" for pk in File.objects.filter(
+                pk__in=[pk for pk in legacy if _is_uuid(pk)], blob__isnull=True
+            ).values_list("pk", flat=True)
+        }
+        for key in batch:
+            if key not in alive:
+                result["derived"] += 1
+                if not dry_run:
+                    shutil.rmtree(derived_dir(key), ignore_errors=True)
+    return result
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,205 @@
+"""
+Очистка брошенных сессий загрузки и учёт места под временные данные
+"""
+import os
+import time
+import shutil
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import FileUploadSession, UploadJob
+from .uploads import get_upload_dir, forget_session, reopen_session
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_max_age():
+    return getattr(settings, "UPLOAD_SESSION_MAX_AGE", timedelta(days=2))
+
+
+def get_idle_timeout():
+    return getattr(settings, "UPLOAD_SESSION_IDLE_TIMEOUT", timedelta(hours=6))
+
+
+def get_job_stall_timeout():
+    return getattr(settings, "UPLOAD_JOB_STALL_TIMEOUT", timedelta(hours=1))
+
+
+# ==============================
+# 🔹 Учёт места
+# ==============================
+def temp_upload_usage():
+    """
+    Живые итоги по незавершённым сессиям: количество и байты на диске.
+    reserved_bytes учитывает предвыделенные файлы целиком.
+    """
+    totals = FileUploadSession.objects.filter(is_complete=False).aggregate(
+        open_sessions=Count("pk"),
+        bytes_on_disk=Coalesce(Sum("received_bytes"), 0),
+        bytes_reserved=Coalesce(Sum(Coalesce("total_size", "received_bytes")), 0),
+    )
+    # Имена агрегатов не должны совпадать с полями модели
+    return {
+        "sessions": totals["open_sessions"],
+        "received_bytes": totals["bytes_on_disk"],
+        "reserved_bytes": totals["bytes_reserved"],
+        "quota_bytes": getattr(settings, "TEMP_UPLOAD_QUOTA_BYTES", None),
+        "max_sessions": getattr(settings, "TEMP_UPLOAD_MAX_SESSIONS", None),
+    }
+
+
+def check_quota(extra_bytes=0):
+    """Текст ошибки, если новая сессия на extra_bytes не помещается в квоту, иначе None"""
+    usage = temp_upload_usage()
+    if usage["max_sessions"] is not None and usage["sessions"] >= usage["max_sessions"]:
+        return "Превышено число одновременных загрузок"
+    if usage["quota_bytes"] is not None and usage["reserved_bytes"] + extra_bytes > usage["quota_bytes"]:
+        return "Недостаточно места для временных файлов загрузки"
+    return None
+
+
+# ==============================
+# 🔹 Очистка
+# ==============================
+def reap_upload_sessions(max_age=None, idle_timeout=None, dry_run=False):
+    """
+    Удаляет незавершённые сессии старше max_age или без активности дольше
+    idle_timeout вместе с их чанками, а также осиротевшие временные каталоги.
+    Зависшие задачи сборки помечает неудачными. Возвращает словарь с итогами.
+    """
+    max_age = max_age if max_age is not None else get_max_age()
+    idle_timeout = idle_timeout if idle_timeout is not None else get_idle_timeout()
+    now = timezone.now()
+
+    expired = FileUploadSession.objects.filter(is_complete=False).filter(
+        Q(created_at__lt=now - max_age) | Q(last_activity__lt=now - idle_timeout)
+    )
+    rows = list(expired.values_list("pk", "upload_id", "received_bytes"))
+    stalled = stalled_jobs(now - get_job_stall_timeout())
+    result = {
+        "sessions": len(rows),
+        "bytes": sum(received for _, _, received in rows),
+        "orphan_dirs": 0,
+        "stalled_jobs": stalled.count(),
+    }
+    if dry_run:
+        return result
+
+    result["stalled_jobs"] = fail_stalled_jobs(stalled)
+
+    if rows:
+        FileUploadSession.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    for _, upload_id, _ in rows:
+        forget_session(upload_id)
+        shutil.rmtree(get_upload_dir(upload_id), ignore_errors=True)
+
+    result["orphan_dirs"] = _remove_orphans(now - idle_timeout)
+    return result
+
+
+def stalled_jobs(cutoff):
+    """
+    Задачи сборки в очереди или в работе, не менявшиеся с cutoff. Пул задач
+    живёт в памяти процесса: после перезапуска такие задачи никто не выполнит
+    """
+    return UploadJob.objects.filter(
+        status__in=[UploadJob.STATUS_QUEUED, UploadJob.STATUS_MERGING],
+        updated_at__lt=cutoff,
+    )
+
+
+def fail_stalled_jobs(jobs):
+    """
+    Помечает задачи неудачными и снова открывает их сессии — клиент
+    досылает чанки и завершает загрузку заново. Возвращает число задач.
+    """
+    failed = 0
+    for job in jobs.select_related("session"):
+        # Задача могла завершиться, пока мы до неё дошли
+        updated = UploadJob.objects.filter(pk=job.pk, status=job.status, updated_at=job.updated_at).update(
+            status=UploadJob.STATUS_FAILED,
+            error="Сборка прервана: задача не выполнялась дольше допустимого",
+            updated_at=timezone.now(),
+        )
+        if updated:
+            reopen_session(job.session)
+            failed += 1
+    return failed
+
+
+def _remove_orphans(cutoff):
+    """
+    Каталоги temp_uploads без открытой сессии (или идущей сборки)
+    и забытые файлы blobs/incoming
+    """
+    removed = 0
+    cutoff_ts = cutoff.timestamp()
+
+    temp_root = os.path.join(settings.MEDIA_ROOT, "temp_uploads")
+    if os.path.isdir(temp_root):
+        names = [e.name for e in os.scandir(temp_root) if e.stat().st_mtime < cutoff_ts]
+        # Завершённая сессия с задачей в очереди или в сборке — тоже живая:
+        # mtime каталога предвыделенной загрузки не меняется с chunk_init
+        active_jobs = Q(jobs__status__in=[UploadJob.STATUS_QUEUED, UploadJob.STATUS_MERGING])
+        known = set(
+            FileUploadSession.objects.filter(upload_id__in=names)
+            .filter(Q(is_complete=False) | active_jobs)
+            .values_list("upload_id", flat=True)
+        )
+        for name in names:
+            if name not in known:
+                path = os.path.join(temp_root, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+                removed += 1
+
+    incoming_root = os.path.join(settings.MEDIA_ROOT, "blobs", "incoming")
+    if os.path.isdir(incoming_root):
+        for entry in os.scandir(incoming_root):
+            if entry.is_file() and entry.stat().st_mtime < cutoff_ts:
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+# ==============================
+# 🔹 Периодический запуск внутри процесса
+# ==============================
+_reaper_thread = None
+_reaper_lock = threading.Lock()
+
+
+def _reaper_loop(interval):
+    while True:
+        time.sleep(interval)
+        close_old_connections()
+        try:
+            result = reap_upload_sessions()
+            if result["sessions"] or result["orphan_dirs"] or result["stalled_jobs"]:
+                logger.info("Очистка загрузок: %s", result)
+        except Exception:
+            logger.exception("Очистка брошенных загрузок завершилась с ошибкой")
+        finally:
+            close_old_connections()
+
+
+def start_reaper(**kwargs):
+    """Запускает фоновый поток очистки раз на процесс (если задан UPLOAD_REAPER_INTERVAL)"""
+    global _reaper_thread
+    interval = getattr(settings, "UPLOAD_REAPER_INTERVAL", None)
+    if not interval:
+        return
+    with _reaper_lock:
+        if _reaper_thread is None:
+            _reaper_thread = threading.Thread(
+                target=_reaper_loop, args=(interval,), name="storage-reaper", daemon=True
+            )
+            _reaper_thread.start()
@@ -1,5 +1,8 @@
 from .models import Folder, File
 from rest_framework import serializers
+from django.urls import reverse
+from .blobs import derived_version
+from .thumbnails import POSTER_FILE, VTT_FILE
 from .models import CustomUser, Role
 from django.contrib.auth import authenticate, get_user_model
 User = get_user_model()
@@ -7,6 +10,9 @@ User = get_user_model()
 
 # serializers.py
 class FileSerializer(serializers.ModelSerializer):
+    poster_url = serializers.SerializerMethodField()
+    sprite_vtt_url = serializers.SerializerMethodField()
+
     class Meta:
         model = File
         fields = [
@@ -16,14 +22,48 @@ class FileSerializer(serializers.ModelSerializer):
             'file',
             'file_type',
             'size',
+            'page_count',
+            'artifacts',
+            'poster_url',
+            'sprite_vtt_url',
             'created_at',
             'updated_at',
         ]
+        # Содержимое меняется только через замену файла (blob и ссылки на него),
+        # состояние обработки и число страниц PDF ведёт сервер
+        read_only_fields = ['file', 'size', 'artifacts', 'page_count']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Неполный набор полей: context['fields'] — какие оставить
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def _thumbnail_url(self, obj, name):
+        # Ссылка есть, только когда постер и спрайт уже сгенерированы
+        if obj.artifacts.get('thumbnails', {}).get('status') != 'ready':
+            return None
+        url = reverse('file-thumbnails', args=[obj.token, derived_version(obj), name])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_poster_url(self, obj):
+        return self._thumbnail_url(obj, POSTER_FILE)
+
+    def get_sprite_vtt_url(self, obj):
+        return self._thumbnail_url(obj, VTT_FILE)
 
 
 class FolderSerializer(serializers.ModelSerializer):
+    """
+    Папка с под-папками и файлами. Если в контексте есть карты из
+    folder_tree_context, дерево собирается из них без запросов к БД;
+    иначе — по запросу на папку
+    """
     subfolders = serializers.SerializerMethodField()
-    files = FileSerializer(many=True, read_only=True)
+    files = serializers.SerializerMethodField()
 
     class Meta:
         model = Folder
@@ -32,18 +72,63 @@ class FolderSerializer(serializers.ModelSerializer):
             'name',
             'token',
             'parent',
+            'total_size',
+            'file_count',
+            'subfolder_count',
             'created_at',
             'updated_at',
             'subfolders',
             'files',
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.context.get('include_files') is False:
+            self.fields.pop('files')
+
     def get_subfolders(self, obj):
-        # Рекурсивная сериализация всех под-папок
-        subfolders = obj.subfolders.all()
-        serializer = FolderSerializer(subfolders, many=True)
+        # Рекурсивная сериализация под-папок; глубже depth — null (не загружались)
+        level = self.context.get('level', 0)
+        depth = self.context.get('depth')
+        if depth is not None and level >= depth:
+            return None
+        children = self.context.get('children')
+        subfolders = obj.subfolders.all() if children is None else children.get(obj.pk, [])
+        serializer = FolderSerializer(subfolders, many=True, context=dict(self.context, level=level + 1))
         return serializer.data
 
+    def get_files(self, obj):
+        files_by_folder = self.context.get('files_by_folder')
+        files = obj.files.all() if files_by_folder is None else files_by_folder.get(obj.pk, [])
+        return FileSerializer(files, many=True, context=self.context).data
+
+
+def folder_tree_context(folders, roots, depth=None, include_files=True, **context):
+    """
+    Контекст FolderSerializer для дерева из уже загруженных папок folders:
+    под-папки берутся из карты parent_id → [папки], файлы — одним запросом
+    только для папок, которые попадут в ответ (не глубже depth от roots)
+    """
+    children = {}
+    for folder in folders:
+        children.setdefault(folder.parent_id, []).append(folder)
+
+    context.update(children=children, depth=depth, include_files=include_files, level=0)
+    if not include_files:
+        return context
+
+    visible, level, current = [], 0, list(roots)
+    while current and (depth is None or level <= depth):
+        visible += [folder.pk for folder in current]
+        current = [child for folder in current for child in children.get(folder.pk, [])]
+        level += 1
+
+    files_by_folder = {}
+    for file in File.objects.filter(folder_id__in=visible):
+        files_by_folder.setdefault(file.folder_id, []).append(file)
+    context['files_by_folder'] = files_by_folder
+    return context
+
 
 class RoleSerializer(serializers.ModelSerializer):
     class Meta:
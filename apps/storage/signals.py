@@ -0,0 +1,128 @@
+"""
+Сигналы моделей: изменения файлов и папок увеличивают версии папок-предков
+и поддерживают итоги поддеревьев (объём, число файлов и под-папок);
+удаление файла освобождает его содержимое
+"""
+import threading
+from contextlib import contextmanager
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from .blobs import release_files
+from .caching import bump_folder_versions, bump_subtree_versions, folder_ancestor_ids
+from .models import File, Folder, path_ids
+from .stats import change_stats, folder_totals, move_stats
+
+
+_suspended = threading.local()
+
+
+@contextmanager
+def suspended():
+    """
+    Внутри блока сигналы не трогают версии и итоги папок и не освобождают
+    содержимое файлов — для массовых операций, после которых всё это
+    делается один раз явно
+    """
+    _suspended.active = True
+    try:
+        yield
+    finally:
+        _suspended.active = False
+
+
+def is_suspended():
+    return getattr(_suspended, "active", False)
+
+
+@receiver(post_init, sender=File)
+@receiver(post_init, sender=Folder)
+def remember_location(sender, instance, **kwargs):
+    # Исходное расположение — чтобы при перемещении обновить и старую ветку.
+    # Через __dict__, чтобы не догружать отложенное (only/defer) поле
+    field = "folder_id" if sender is File else "parent_id"
+    instance._loaded_parent_id = instance.__dict__.get(field)
+    if sender is Folder:
+        instance._loaded_name = instance.__dict__.get("name")
+        instance._loaded_path = instance.__dict__.get("path")
+    else:
+        instance._loaded_size = instance.__dict__.get("size")
+
+
+def _touches(kwargs, *fields):
+    # save(update_fields=...) без этих полей итоги не меняет
+    update_fields = kwargs.get("update_fields")
+    return kwargs["created"] or update_fields is None or bool(set(update_fields) & set(fields))
+
+
+@receiver(post_save, sender=File)
+def file_saved(sender, instance, **kwargs):
+    if is_suspended():
+        return
+    bump_folder_versions(instance._loaded_parent_id, instance.folder_id)
+
+    if _touches(kwargs, "folder", "size"):
+        old_size = 0 if kwargs["created"] else instance._loaded_size or 0
+        new_size = instance.size or 0
+        new_chain = folder_ancestor_ids(instance.folder_id)
+        if kwargs["created"]:
+            change_stats(new_chain, new_size, 1)
+        else:
+            if instance._loaded_parent_id != instance.folder_id:
+                move_stats(folder_ancestor_ids(instance._loaded_parent_id), new_chain, (old_size, 1, 0))
+            change_stats(new_chain, new_size - old_size)
+
+    instance._loaded_parent_id = instance.folder_id
+    instance._loaded_size = instance.__dict__.get("size")
+
+
+@receiver(pre_delete, sender=File)
+def file_deleting(sender, instance, **kwargs):
+    # До удаления: при каскаде папка файла к post_delete может быть уже удалена
+    if is_suspended():
+        return
+    change_stats(folder_ancestor_ids(instance.folder_id), -(instance.size or 0), -1)
+
+
+@receiver(post_delete, sender=File)
+def file_deleted(sender, instance, **kwargs):
+    if is_suspended():
+        return
+    bump_folder_versions(instance.folder_id)
+    # Содержимое освобождается при любом удалении — из API, админки или
+    # каскадом; массовые операции освобождают его сами через release_files
+    release_files([(instance.pk, instance.blob_id, instance.file.name)])
+
+
+@receiver(post_save, sender=Folder)
+def folder_saved(sender, instance, **kwargs):
+    if is_suspended():
+        return
+    # Сама папка (имя) входит в ответ родителя, поэтому от неё и вверх
+    bump_folder_versions(instance._loaded_parent_id, instance.pk)
+
+    # Итоги: новая папка — +1 под-папка предкам; перемещённая — всё её
+    # поддерево переходит из старой цепочки предков в новую
+    if kwargs["created"]:
+        change_stats(instance.ancestor_ids(), subfolders=1)
+    elif instance._loaded_parent_id != instance.parent_id and instance._loaded_path:
+        move_stats(path_ids(instance._loaded_path)[:-1], instance.ancestor_ids(), folder_totals(instance.pk))
+
+    # Имя и положение папки видны в хлебных крошках всех вложенных папок
+    if not kwargs["created"] and (
+        instance._loaded_parent_id != instance.parent_id
+        or instance._loaded_name != instance.__dict__.get("name")
+    ):
+        bump_subtree_versions(instance.path)
+    instance._loaded_parent_id = instance.parent_id
+    instance._loaded_name = instance.__dict__.get("name")
+    instance._loaded_path = instance.path
+
+
+@receiver(post_delete, sender=Folder)
+def folder_deleted(sender, instance, **kwargs):
+    if is_suspended():
+        return
+    bump_folder_versions(instance.parent_id)
+    # Файлы внутри вычитают себя сами (pre_delete), поэтому каждая
+    # удалённая папка вычитает из предков только себя
+    change_stats(instance.ancestor_ids(), subfolders=-1)
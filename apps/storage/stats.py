@@ -0,0 +1,75 @@
+"""
+Итоги папок по поддереву (объём, число файлов и под-папок): инкрементально
+по цепочке предков и полным пересчётом для сверки
+"""
+from django.db.models import Count, F, Sum
+from .models import File, Folder, path_ids
+
+
+FIELDS = ("total_size", "file_count", "subfolder_count")
+
+
+def move_stats(old_ids, new_ids, totals):
+    """
+    Переносит итоги totals = (объём, файлы, под-папки) из цепочки папок
+    old_ids в цепочку new_ids. Общие предки не меняются; одним UPDATE на
+    каждую из двух групп. Создание — пустой old_ids, удаление — пустой new_ids.
+    """
+    old_ids, new_ids = set(old_ids), set(new_ids)
+    for ids, sign in ((old_ids - new_ids, -1), (new_ids - old_ids, 1)):
+        if ids and any(totals):
+            Folder.objects.filter(pk__in=ids).update(**{
+                field: F(field) + sign * value for field, value in zip(FIELDS, totals)
+            })
+
+
+def change_stats(ids, size=0, files=0, subfolders=0):
+    """Изменение итогов одной цепочки папок (например, новый размер файла)"""
+    move_stats((), ids, (size, files, subfolders))
+
+
+def folder_totals(folder_id):
+    """Итоги поддерева папки вместе с ней самой — как под-папки для родителя"""
+    total_size, file_count, subfolder_count = Folder.objects.filter(pk=folder_id).values_list(*FIELDS).get()
+    return total_size, file_count, subfolder_count + 1
+
+
+def compute_folder_stats():
+    """
+    Итоги всех папок с нуля: два запроса (пути папок и суммы файлов по
+    папкам), свёртка по цепочкам предков — в памяти
+    """
+    paths = dict(Folder.objects.values_list("pk", "path"))
+    stats = {pk: [0, 0, 0] for pk in paths}
+
+    for pk, path in paths.items():
+        for ancestor in path_ids(path)[:-1]:
+            if ancestor in stats:
+                stats[ancestor][2] += 1
+
+    direct = File.objects.filter(folder__isnull=False).values("folder_id").annotate(
+        size=Sum("size"), count=Count("pk")
+    )
+    for row in direct:
+        for ancestor in path_ids(paths.get(row["folder_id"], "")):
+            if ancestor in stats:
+                stats[ancestor][0] += row["size"] or 0
+                stats[ancestor][1] += row["count"]
+    return stats
+
+
+def rebuild_folder_stats(dry_run=False):
+    """Сверяет сохранённые итоги с пересчитанными и исправляет расхождения"""
+    stats = compute_folder_stats()
+    stale = []
+    for folder in Folder.objects.only(*FIELDS):
+        expected = stats.get(folder.pk, [0, 0, 0])
+        if [getattr(folder, field) for field in FIELDS] != expected:
+            for field, value in zip(FIELDS, expected):
+                setattr(folder, field, value)
+            stale.append(folder)
+
+    if stale and not dry_run:
+        Folder.objects.bulk_update(stale, FIELDS, batch_size=500)
+    return len(stale)
+
@@ -0,0 +1,218 @@
+"""
+Отдача файлов по HTTP Range (206): один диапазон и multipart/byteranges
+"""
+import os
+import uuid
+import mimetypes
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from rest_framework.negotiation import BaseContentNegotiation
+from .uploads import get_buffer_size
+
+
+# Больше диапазонов в одном запросе не обслуживаем — отдаём файл целиком
+MAX_RANGES = 16
+
+DELIVERY_DJANGO = "django"
+DELIVERY_X_ACCEL = "x-accel"
+DELIVERY_X_SENDFILE = "x-sendfile"
+
+
+class MediaContentNegotiation(BaseContentNegotiation):
+    """
+    Плееры присылают Accept вида video/*, под который нет рендерера DRF.
+    Содержимое файла отдаётся мимо рендереров, а ошибки — первым из них (JSON).
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def guess_content_type(name):
+    content_type, _ = mimetypes.guess_type(name)
+    return content_type or "application/octet-stream"
+
+
+def parse_range_header(header, size):
+    """
+    Разбирает заголовок Range: bytes=0-99,200-,-500.
+    Возвращает список (start, end) включительно, отсортированный и без
+    пересечений; [] — ни один диапазон не попадает в файл (416);
+    None — заголовка нет или он некорректен (отдаём файл целиком, 200).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                # Суффикс: последние N байт
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else start
+                if start > end:
+                    return None
+                end = min(end, size - 1) if last else size - 1
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < size:
+            ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Склеиваем пересекающиеся и соседние диапазоны
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_file_range(fileobj, start, length, buffer_size=None):
+    """Читает length байт файла начиная с start блоками по buffer_size"""
+    buffer_size = buffer_size or get_buffer_size()
+    fileobj.seek(start)
+    remaining = length
+    while remaining > 0:
+        block = fileobj.read(min(buffer_size, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
+
+
+def _iter_ranges(path, parts):
+    """parts — последовательность байтовых строк и диапазонов (start, length)"""
+    with open(path, "rb") as f:
+        for part in parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield from iter_file_range(f, *part)
+
+
+def _if_range_matches(request, mtime):
+    """If-Range с датой: диапазон отдаём, только если файл с тех пор не менялся"""
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    since = parse_http_date_safe(value)
+    return since is not None and int(mtime) <= since
+
+
+def range_response(request, path, content_type=None, filename=None, as_attachment=False):
+    """
+    Ответ с содержимым файла path с учётом заголовка Range:
+    200 — файл целиком (FileResponse, sendfile через wsgi.file_wrapper),
+    206 — один диапазон или несколько в multipart/byteranges,
+    416 — запрошенные диапазоны вне файла.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    content_type = content_type or guess_content_type(filename or path)
+    is_head = request.method == "HEAD"
+
+    ranges = None
+    if _if_range_matches(request, stat.st_mtime):
+        ranges = parse_range_header(request.headers.get("Range"), size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif ranges is None:
+        if is_head:
+            response = HttpResponse(content_type=content_type)
+            response["Content-Length"] = size
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            [] if is_head else _iter_ranges(path, [(start, length)]),
+            status=206, content_type=content_type,
+        )
+        response["Content-Length"] = length
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        boundary = uuid.uuid4().hex
+        parts = []
+        for start, end in ranges:
+            parts.append((
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("ascii"))
+            parts.append((start, end - start + 1))
+        parts.append(f"\r\n--{boundary}--\r\n".encode("ascii"))
+        length = sum(len(p) if isinstance(p, bytes) else p[1] for p in parts)
+        response = StreamingHttpResponse(
+            [] if is_head else _iter_ranges(path, parts),
+            status=206, content_type=f"multipart/byteranges; boundary={boundary}",
+        )
+        response["Content-Length"] = length
+
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if filename and response.status_code != 416:
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+# ==============================
+# 🔹 Отдача через фронтовой веб-сервер
+# ==============================
+def get_delivery_mode():
+    mode = getattr(settings, "MEDIA_DELIVERY_MODE", DELIVERY_DJANGO)
+    if mode not in (DELIVERY_DJANGO, DELIVERY_X_ACCEL, DELIVERY_X_SENDFILE):
+        raise ImproperlyConfigured(f"Неизвестный MEDIA_DELIVERY_MODE: {mode!r}")
+    return mode
+
+
+def offload_response(path, mode, content_type=None, filename=None, as_attachment=False):
+    """
+    Пустой ответ с заголовком для nginx (X-Accel-Redirect) или
+    Apache/lighttpd (X-Sendfile): байты, Range и HEAD обслуживает веб-сервер
+    """
+    response = HttpResponse(content_type=content_type or guess_content_type(filename or path))
+    if mode == DELIVERY_X_ACCEL:
+        relative = os.path.relpath(path, settings.MEDIA_ROOT)
+        if relative.startswith(os.pardir):
+            raise ImproperlyConfigured(f"{path} вне MEDIA_ROOT — X-Accel-Redirect невозможен")
+        prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected/")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+    else:
+        response["X-Sendfile"] = path
+    if filename:
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def deliver_file(request, path, content_type=None, filename=None, as_attachment=False):
+    """Отдаёт файл способом из MEDIA_DELIVERY_MODE (по умолчанию — сам Django с Range)"""
+    mode = get_delivery_mode()
+    if mode == DELIVERY_DJANGO:
+        return range_response(request, path, content_type, filename, as_attachment)
+    return offload_response(path, mode, content_type, filename, as_attachment)
@@ -1,3 +1,241 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.request import Request
+from .delta import DeltaError, apply_delta, parse_instructions
+from .models import File, FileUploadSession
+from .pagination import KeysetPagination
+from .streaming import MAX_RANGES, parse_range_header, range_response
 
-# Create your tests here.
+
+# ==============================
+# 🔹 Дельта-замена
+# ==============================
+class ParseInstructionsTests(SimpleTestCase):
+    def test_parses_copy_and_data(self):
+        parsed = parse_instructions('[{"op": "copy", "block": 2, "count": 3}, {"op": "data", "length": 10}]')
+        self.assertEqual(parsed, [("copy", 2, 3), ("data", 10, None)])
+
+    def test_copy_count_defaults_to_one(self):
+        self.assertEqual(parse_instructions([{"op": "copy", "block": 0}]), [("copy", 0, 1)])
+
+    def test_rejects_malformed(self):
+        for raw in ("не json", "{}", "[]", "[1]", '[{"op": "move"}]', '[{"op": "copy"}]', '[{"op": "data", "length": "x"}]'):
+            with self.subTest(raw=raw), self.assertRaises(DeltaError):
+                parse_instructions(raw)
+
+
+class ApplyDeltaTests(SimpleTestCase):
+    # Блоки по 4 байта: aaaa bbbb cc
+    BASE = b"aaaabbbbcc"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.base_path = os.path.join(self.tmp_dir, "base")
+        self.out_path = os.path.join(self.tmp_dir, "out")
+        with open(self.base_path, "wb") as f:
+            f.write(self.BASE)
+
+    def apply(self, instructions, data=None):
+        stream = io.BytesIO(data) if data is not None else None
+        size = apply_delta(self.base_path, instructions, stream, 4, self.out_path)
+        with open(self.out_path, "rb") as f:
+            return size, f.read()
+
+    def test_copies_blocks_and_inserts_data(self):
+        size, content = self.apply([("copy", 1, 2), ("data", 3, None), ("copy", 0, 1)], b"XYZ")
+        self.assertEqual(content, b"bbbbccXYZaaaa")
+        self.assertEqual(size, len(content))
+
+    def test_short_last_block_is_copied_as_is(self):
+        self.assertEqual(self.apply([("copy", 0, 3)])[1], self.BASE)
+
+    def test_rejects_blocks_outside_base(self):
+        for first, count in ((3, 1), (2, 2), (-1, 1), (0, 0)):
+            with self.subTest(first=first, count=count), self.assertRaises(DeltaError):
+                self.apply([("copy", first, count)])
+
+    def test_rejects_short_data(self):
+        with self.assertRaises(DeltaError):
+            self.apply([("data", 5, None)], b"abc")
+
+    def test_rejects_extra_data(self):
+        with self.assertRaises(DeltaError):
+            self.apply([("data", 2, None)], b"abc")
+
+    def test_rejects_data_op_without_data(self):
+        with self.assertRaises(DeltaError):
+            self.apply([("data", 2, None)])
+
+
+# ==============================
+# 🔹 HTTP Range
+# ==============================
+class ParseRangeHeaderTests(SimpleTestCase):
+    SIZE = 1000
+
+    def parse(self, header):
+        return parse_range_header(header, self.SIZE)
+
+    def test_single_ranges(self):
+        self.assertEqual(self.parse("bytes=0-99"), [(0, 99)])
+        self.assertEqual(self.parse("bytes=500-"), [(500, 999)])
+        self.assertEqual(self.parse("bytes=900-5000"), [(900, 999)])
+
+    def test_suffix_ranges(self):
+        self.assertEqual(self.parse("bytes=-100"), [(900, 999)])
+        # Суффикс длиннее файла — весь файл
+        self.assertEqual(self.parse("bytes=-5000"), [(0, 999)])
+
+    def test_overlapping_and_adjacent_ranges_are_merged(self):
+        self.assertEqual(self.parse("bytes=50-150, 0-99"), [(0, 150)])
+        self.assertEqual(self.parse("bytes=0-9,10-19,30-39"), [(0, 19), (30, 39)])
+        self.assertEqual(self.parse("bytes=-100,950-"), [(900, 999)])
+
+    def test_unsatisfiable_returns_empty_list(self):
+        # [] — ни один диапазон не попадает в файл: ответ 416
+        self.assertEqual(self.parse("bytes=1000-"), [])
+        self.assertEqual(self.parse("bytes=-0"), [])
+        self.assertEqual(self.parse("bytes=2000-3000,5000-"), [])
+
+    def test_unsatisfiable_parts_are_dropped(self):
+        self.assertEqual(self.parse("bytes=2000-3000,0-9"), [(0, 9)])
+
+    def test_invalid_header_means_whole_file(self):
+        for header in (None, "", "items=0-9", "bytes=", "bytes=9-0", "bytes=abc", "bytes=0-x", "bytes=5"):
+            with self.subTest(header=header):
+                self.assertIsNone(self.parse(header))
+
+    def test_too_many_ranges_means_whole_file(self):
+        header = "bytes=" + ",".join(f"{i * 10}-{i * 10}" for i in range(MAX_RANGES + 1))
+        self.assertIsNone(self.parse(header))
+
+
+class RangeResponseTests(SimpleTestCase):
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, "file.bin")
+        with open(self.path, "wb") as f:
+            f.write(self.CONTENT)
+
+    def get(self, range_header=None):
+        headers = {"Range": range_header} if range_header else {}
+        return range_response(RequestFactory().get("/", headers=headers), self.path)
+
+    def test_single_range(self):
+        response = self.get("bytes=-10")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 1014-1023/1024")
+        self.assertEqual(b"".join(response.streaming_content), self.CONTENT[-10:])
+
+    def test_multiple_ranges(self):
+        response = self.get("bytes=0-1,10-11")
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges"))
+        body = b"".join(response.streaming_content)
+        self.assertEqual(len(body), int(response["Content-Length"]))
+        self.assertIn(b"Content-Range: bytes 10-11/1024\r\n\r\n" + self.CONTENT[10:12], body)
+
+    def test_unsatisfiable_range(self):
+        response = self.get("bytes=5000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_without_range_returns_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.CONTENT)
+        response.close()
+
+
+# ==============================
+# 🔹 Докачка загрузок
+# ==============================
+class MissingRangesTests(SimpleTestCase):
+    def session(self, total_chunks, received=()):
+        session = FileUploadSession(total_chunks=total_chunks, received_bitmap=bytes((total_chunks + 7) // 8))
+        for index in received:
+            session.mark_chunk(index)
+        return session
+
+    def test_nothing_received(self):
+        self.assertEqual(self.session(20).missing_ranges(), [[0, 19]])
+
+    def test_everything_received(self):
+        self.assertEqual(self.session(20, range(20)).missing_ranges(), [])
+
+    def test_gaps_across_byte_boundaries(self):
+        session = self.session(20, [0, 1, 2, 9, 10, 11, 12, 13, 14, 15, 16])
+        self.assertEqual(session.missing_ranges(), [[3, 8], [17, 19]])
+
+    def test_partial_last_byte(self):
+        self.assertEqual(self.session(11, range(10)).missing_ranges(), [[10, 10]])
+        self.assertEqual(self.session(11, [10]).missing_ranges(), [[0, 9]])
+
+    def test_short_or_empty_bitmap(self):
+        session = FileUploadSession(total_chunks=10, received_bitmap=b"")
+        self.assertEqual(session.missing_ranges(), [[0, 9]])
+        session.mark_chunk(3)
+        self.assertEqual(session.missing_ranges(), [[0, 2], [4, 9]])
+
+    def test_repeated_chunk_is_counted_once(self):
+        session = self.session(4)
+        self.assertTrue(session.mark_chunk(1))
+        self.assertFalse(session.mark_chunk(1))
+        self.assertEqual(session.received_chunks, 1)
+
+
+# ==============================
+# 🔹 Постраничная выдача по ключу
+# ==============================
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        # Пять файлов с одинаковым created_at: порядок решает id
+        for i in range(12):
+            created_at = now - timedelta(minutes=i if i < 7 else 7)
+            File.objects.create(name=f"f{i}.txt", file=f"uploads/f{i}.txt", file_type="document", created_at=created_at)
+        cls.expected = list(File.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+
+    def page(self, **params):
+        paginator = KeysetPagination()
+        request = Request(RequestFactory().get("/files/", params))
+        page = paginator.paginate_queryset(File.objects.all(), request)
+        return [obj.pk for obj in page], paginator
+
+    def test_walks_all_rows_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 5, **({"cursor": cursor} if cursor else {})}
+            pks, paginator = self.page(**params)
+            seen += pks
+            cursor = paginator.next_cursor
+            if cursor is None:
+                break
+            self.assertIn(f"cursor={cursor}", paginator.get_next_link())
+        self.assertEqual(seen, self.expected)
+
+    def test_last_full_page_has_no_next(self):
+        pks, paginator = self.page(limit=12)
+        self.assertEqual(pks, self.expected)
+        self.assertIsNone(paginator.next_cursor)
+        self.assertIsNone(paginator.get_next_link())
+
+    def test_limit_is_capped(self):
+        paginator = KeysetPagination()
+        request = Request(RequestFactory().get("/files/", {"limit": 10 ** 6}))
+        self.assertEqual(paginator.get_limit(request), paginator.max_page_size)
+
+    def test_invalid_params(self):
+        for params in ({"limit": "x"}, {"limit": 0}, {"cursor": "не курсор"}, {"cursor": "YWJj"}):
+            with self.subTest(params=params), self.assertRaises(ValueError):
+                self.page(**params)
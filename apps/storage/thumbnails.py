@@ -0,0 +1,119 @@
+"""
+Постер и спрайт-лист кадров видео с индексом WebVTT для превью при перемотке
+"""
+import os
+import json
+import math
+import uuid
+import shutil
+from django.conf import settings
+from . import ffmpeg
+from .blobs import derived_dir
+
+
+POSTER_FILE = "poster.jpg"
+SPRITE_FILE = "sprite.jpg"
+VTT_FILE = "sprite.vtt"
+META_FILE = "thumbnails.json"
+
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".vtt": "text/vtt",
+}
+
+
+def thumbnails_dir(key):
+    return os.path.join(derived_dir(key), "thumbnails")
+
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def _timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def sprite_layout(duration):
+    """
+    Интервал между кадрами и их число: не чаще SPRITE_INTERVAL секунд
+    и не больше SPRITE_MAX_FRAMES кадров на весь ролик
+    """
+    interval = max(
+        getattr(settings, "SPRITE_INTERVAL", 10),
+        duration / getattr(settings, "SPRITE_MAX_FRAMES", 100),
+    )
+    count = max(1, math.ceil(duration / interval))
+    return interval, count
+
+
+def build_vtt(duration, interval, count, columns, width, height):
+    """WebVTT: на каждый отрезок — ссылка на клетку спрайта (#xywh=...)"""
+    lines = ["WEBVTT", ""]
+    for i in range(count):
+        start, end = i * interval, min((i + 1) * interval, duration)
+        x, y = (i % columns) * width, (i // columns) * height
+        lines += [
+            f"{_timestamp(start)} --> {_timestamp(end)}",
+            f"{SPRITE_FILE}#xywh={x},{y},{width},{height}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def generate_thumbnails(file_obj, key):
+    """
+    Обработчик ingest для видео: постер (кадр на POSTER_POSITION длительности)
+    и спрайт-лист кадров через равные интервалы с индексом sprite.vtt
+    """
+    target_dir = thumbnails_dir(key)
+    meta_path = os.path.join(target_dir, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return json.load(f)
+
+    source = file_obj.file.path
+    info = ffmpeg.probe(source)
+    if not info["height"]:
+        raise ffmpeg.FFmpegError("в файле нет видеопотока")
+
+    duration = info["duration"]
+    poster_width = getattr(settings, "POSTER_WIDTH", 640)
+    thumb_width = getattr(settings, "SPRITE_THUMB_WIDTH", 160)
+    thumb_height = _even(thumb_width * info["height"] / info["width"])
+    columns = getattr(settings, "SPRITE_COLUMNS", 10)
+    interval, count = sprite_layout(duration)
+    rows = math.ceil(count / columns)
+
+    tmp_dir = f"{target_dir}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_dir)
+    try:
+        # -ss перед -i — быстрый переход по ключевым кадрам
+        ffmpeg.run([
+            "-ss", f"{duration * getattr(settings, 'POSTER_POSITION', 0.1):.3f}", "-i", source,
+            "-frames:v", "1", "-vf", f"scale={poster_width}:-2", "-q:v", "3",
+            os.path.join(tmp_dir, POSTER_FILE),
+        ])
+        # Декодируются только ключевые кадры — в разы быстрее полного декодирования
+        ffmpeg.run([
+            "-skip_frame", "nokey", "-i", source, "-an",
+            "-vf", f"fps=1/{interval:.3f},scale={thumb_width}:{thumb_height},tile={columns}x{rows}",
+            "-frames:v", "1", "-q:v", "5",
+            os.path.join(tmp_dir, SPRITE_FILE),
+        ])
+        with open(os.path.join(tmp_dir, VTT_FILE), "w") as f:
+            f.write(build_vtt(duration, interval, count, columns, thumb_width, thumb_height))
+
+        meta = {"interval": round(interval, 3), "frames": count, "width": thumb_width, "height": thumb_height}
+        with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.replace(tmp_dir, target_dir)
+        except OSError:
+            if not os.path.exists(meta_path):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return meta
@@ -0,0 +1,154 @@
+"""
+Обработчик multipart-загрузок с ограниченным бюджетом памяти
+"""
+import io
+import os
+import struct
+import hashlib
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from .blobs import incoming_path
+
+
+SNIFF_BYTES = 18
+
+# Размеры DIB-заголовка BMP: BITMAPCOREHEADER, BITMAPINFOHEADER и его версии
+BMP_DIB_SIZES = {12, 40, 52, 56, 64, 108, 124}
+
+
+def is_bmp(head, size=None):
+    """
+    Два байта «BM» встречаются и в начале обычного текста, поэтому проверяем
+    и заголовок: известный размер DIB-заголовка и (если известен) размер файла
+    """
+    if len(head) < 18 or not head.startswith(b"BM"):
+        return False
+    file_size, pixel_offset, dib_size = struct.unpack("<I4xII", head[2:18])
+    if dib_size not in BMP_DIB_SIZES or pixel_offset < 14 + dib_size:
+        return False
+    return size is None or file_size == size
+
+
+def sniff_content_type(head, size=None):
+    """MIME-тип по сигнатуре первых байт файла; None, если сигнатура неизвестна"""
+    if head.startswith(b"%PDF"):
+        return "application/pdf"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if is_bmp(head, size):
+        return "image/bmp"
+    if head.startswith(b"RIFF"):
+        return {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}.get(head[8:12])
+    if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mpeg"
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"\x1aE\xdf\xa3"):
+        return "video/x-matroska"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand in (b"M4A ", b"M4B "):
+            return "audio/mp4"
+        return "video/mp4"
+    return None
+
+
+class HashedUploadedFile(UploadedFile):
+    """Загруженный файл с уже посчитанными размером, SHA-256 и типом по сигнатуре"""
+
+    def __init__(self, file, name, content_type, size, charset, sha256, sniffed_type, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+        self.sniffed_type = sniffed_type
+
+    @property
+    def file_type(self):
+        """Тип для модели File по сигнатуре содержимого"""
+        if not self.sniffed_type:
+            return None
+        if self.sniffed_type == "application/pdf":
+            return "document"
+        return self.sniffed_type.split("/")[0]
+
+    def chunks(self, chunk_size=None):
+        self.file.seek(0)
+        yield from super().chunks(chunk_size)
+
+
+class SpilledHashedUploadedFile(HashedUploadedFile):
+    """Файл, превысивший порог и записанный на диск рядом с хранилищем blob'ов"""
+
+    def __init__(self, *args, path, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            # Если файл не забрали в хранилище — удаляем
+            if os.path.exists(self._path):
+                os.remove(self._path)
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Держит файл в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE, дальше пишет на диск
+    (blobs/incoming, чтобы потом перенести в хранилище переименованием).
+    В том же проходе считает размер, SHA-256 и тип по сигнатуре.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.threshold = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.path = None
+        self.file = io.BytesIO()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha.update(raw_data)
+        self.size += len(raw_data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+
+        if self.path is None and self.size > self.threshold:
+            self.path = incoming_path()
+            spilled = open(self.path, "w+b")
+            spilled.write(self.file.getvalue())
+            self.file = spilled
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        kwargs = dict(
+            file=self.file,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=self.size,
+            charset=self.charset,
+            sha256=self.sha.hexdigest(),
+            sniffed_type=sniff_content_type(self.head, self.size),
+            content_type_extra=self.content_type_extra,
+        )
+        if self.path is None:
+            return HashedUploadedFile(**kwargs)
+        return SpilledHashedUploadedFile(path=self.path, **kwargs)
+
+    def upload_interrupted(self):
+        if self.path and os.path.exists(self.path):
+            self.file.close()
+            os.remove(self.path)
@@ -0,0 +1,370 @@
+"""
+Работа с временными файлами загрузки по чанкам
+"""
+import os
+import errno
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import FileUploadSession
+
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024  # 1 МБ
+
+
+def get_buffer_size():
+    """Максимум байт, которые запрос держит в памяти при записи чанка"""
+    return getattr(settings, "CHUNK_UPLOAD_BUFFER_SIZE", DEFAULT_BUFFER_SIZE)
+
+
+def get_upload_dir(upload_id):
+    return os.path.join(settings.MEDIA_ROOT, "temp_uploads", upload_id)
+
+
+def stream_to_file(stream, fileobj, buffer_size=None, hasher=None):
+    """
+    Копирует входной поток в файл блоками фиксированного размера,
+    попутно обновляя hasher, если он передан.
+    Возвращает количество записанных байт.
+    """
+    buffer_size = buffer_size or get_buffer_size()
+    written = 0
+    while True:
+        block = stream.read(buffer_size)
+        if not block:
+            break
+        fileobj.write(block)
+        if hasher is not None:
+            hasher.update(block)
+        written += len(block)
+    return written
+
+
+def save_chunk(upload_id, chunk_index, stream, hasher=None, expected_length=None):
+    """
+    Пишет тело запроса в temp_uploads/<upload_id>/chunk_<index> по мере поступления.
+    Чанк сначала пишется во временный файл и переименовывается только целиком,
+    поэтому оборванная передача не оставляет «половинчатый» chunk_N.
+    Если получено не expected_length байт (клиент оборвал соединение) —
+    ValueError, временный файл удаляется.
+    """
+    temp_dir = get_upload_dir(upload_id)
+    os.makedirs(temp_dir, exist_ok=True)
+
+    chunk_path = os.path.join(temp_dir, f"chunk_{chunk_index}")
+    part_path = os.path.join(temp_dir, f"tmp_chunk_{chunk_index}")
+    try:
+        with open(part_path, "wb", buffering=0) as f:
+            written = stream_to_file(stream, f, hasher=hasher)
+        if expected_length is not None and written != expected_length:
+            raise ValueError(f"Ожидалось {expected_length} байт для чанка {chunk_index}, получено {written}")
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    os.replace(part_path, chunk_path)
+    return written
+
+
+# ==============================
+# 🔹 Инкрементальный SHA-256
+# ==============================
+def hash_file(path, hasher=None, offset=0):
+    """Дочитывает файл с offset в hasher (или в новый sha256) блоками фиксированного размера"""
+    hasher = hasher or hashlib.sha256()
+    buffer_size = get_buffer_size()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            block = f.read(buffer_size)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher
+
+
+class ChunkHasher:
+    """
+    SHA-256 загружаемого файла, считаемый по мере прихода чанков.
+    В хэш попадают только чанки, пришедшие по порядку; всё, что пришло не по
+    порядку, дочитывается с диска при сборке (finish).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sha = hashlib.sha256()
+        self.next_index = 0
+        self.offset = 0
+        self.valid = True
+
+    def begin(self, chunk_index):
+        """Копия состояния хэша, если этот чанк — следующий по порядку, иначе None"""
+        with self.lock:
+            if chunk_index < self.next_index:
+                # Повтор уже учтённого чанка: содержимое могло измениться
+                self.valid = False
+            if not self.valid or chunk_index != self.next_index:
+                return None
+            return self.sha.copy()
+
+    def commit(self, chunk_index, sha, length):
+        with self.lock:
+            if self.valid and chunk_index == self.next_index:
+                self.sha = sha
+                self.next_index += 1
+                self.offset += length
+
+    def finish(self, path):
+        """Hex-дайджест итогового файла с дочитыванием непосчитанного хвоста"""
+        with self.lock:
+            if not self.valid:
+                return hash_file(path).hexdigest()
+            return hash_file(path, self.sha.copy(), self.offset).hexdigest()
+
+
+# ==============================
+# 🔹 Кэш открытых сессий
+# ==============================
+# Неизменяемые поля сессии (total_chunks, размеры) держим в памяти процесса,
+# чтобы не искать сессию в БД на каждый чанк. Каждой сессии соответствует свой
+# замок: параллельные чанки одной сессии отмечаются в битовой карте по очереди,
+# а между процессами их разводит select_for_update.
+SESSION_CACHE_SIZE = 1024
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+class OpenSession:
+    """Запись кэша: сессия, замок её битовой карты и инкрементальный SHA-256"""
+
+    def __init__(self, session):
+        self.session = session
+        self.lock = threading.Lock()
+        self.hasher = ChunkHasher()
+
+
+def get_open_session(upload_id):
+    """Возвращает OpenSession для незавершённой сессии или None"""
+    with _sessions_lock:
+        entry = _sessions.get(upload_id)
+        if entry is not None:
+            _sessions.move_to_end(upload_id)
+            return entry
+
+    session = FileUploadSession.objects.filter(upload_id=upload_id, is_complete=False).first()
+    if not session:
+        return None
+
+    with _sessions_lock:
+        entry = _sessions.setdefault(upload_id, OpenSession(session))
+        _sessions.move_to_end(upload_id)
+        while len(_sessions) > SESSION_CACHE_SIZE:
+            _sessions.popitem(last=False)
+    return entry
+
+
+def forget_session(upload_id):
+    """Убирает сессию из кэша и возвращает её запись (с накопленным хэшем)"""
+    with _sessions_lock:
+        return _sessions.pop(upload_id, None)
+
+
+def reopen_session(session):
+    """
+    Снова открывает сессию после неудачной сборки. Чанки к этому моменту уже
+    израсходованы (склеены или перенесены), поэтому отметки о полученных
+    сбрасываются и временные файлы создаются заново — клиент досылает всё
+    """
+    forget_session(session.upload_id)
+    shutil.rmtree(get_upload_dir(session.upload_id), ignore_errors=True)
+    if session.is_preallocated:
+        preallocate_target(session.upload_id, session.total_size)
+
+    session.received_bitmap = b""
+    session.received_chunks = 0
+    session.received_bytes = 0
+    session.is_complete = False
+    session.last_activity = timezone.now()
+    session.save(update_fields=[
+        "received_bitmap", "received_chunks", "received_bytes", "is_complete", "last_activity",
+    ])
+
+
+def session_removed(entry):
+    """
+    Удалили ли сессию из кэша в другом процессе (очистка брошенных загрузок).
+    Каталог сессии без предвыделения создаётся первым чанком и удаляется
+    вместе с ней, поэтому в БД смотрим, только если каталога нет.
+    """
+    if os.path.isdir(get_upload_dir(entry.session.upload_id)):
+        return False
+    if FileUploadSession.objects.filter(pk=entry.session.pk, is_complete=False).exists():
+        return False
+    forget_session(entry.session.upload_id)
+    return True
+
+
+def mark_chunk_received(entry, chunk_index, length):
+    """
+    Атомарно отмечает чанк в битовой карте сессии.
+    Возвращает актуальную сессию или None, если она уже завершена или удалена.
+    """
+    upload_id = entry.session.upload_id
+    with entry.lock, transaction.atomic():
+        current = (
+            FileUploadSession.objects.select_for_update()
+            .only("received_bitmap", "received_chunks", "received_bytes", "total_chunks", "is_complete")
+            .filter(pk=entry.session.pk)
+            .first()
+        )
+        if current is None:
+            # Сессию удалили в другом процессе — записанный чанк никому не нужен
+            forget_session(upload_id)
+            shutil.rmtree(get_upload_dir(upload_id), ignore_errors=True)
+            return None
+        if current.is_complete:
+            forget_session(upload_id)
+            return None
+        if current.mark_chunk(chunk_index):
+            current.received_bytes += length
+        current.last_activity = timezone.now()
+        current.save(update_fields=["received_bitmap", "received_chunks", "received_bytes", "last_activity"])
+    return current
+
+
+# ==============================
+# 🔹 Предвыделенный целевой файл
+# ==============================
+def get_target_path(upload_id):
+    return os.path.join(get_upload_dir(upload_id), "target")
+
+
+def preallocate_target(upload_id, total_size):
+    """
+    Создаёт разреженный файл нужного размера: место на диске занимают
+    только реально записанные чанки
+    """
+    os.makedirs(get_upload_dir(upload_id), exist_ok=True)
+    with open(get_target_path(upload_id), "wb") as f:
+        f.truncate(total_size)
+
+
+def write_chunk_at(upload_id, offset, stream, length, buffer_size=None, hasher=None):
+    """
+    Пишет чанк через pwrite прямо в целевой файл начиная с offset.
+    Записывается не больше length байт; возвращает фактически прочитанное количество.
+    """
+    buffer_size = buffer_size or get_buffer_size()
+    fd = os.open(get_target_path(upload_id), os.O_WRONLY)
+    written = 0
+    try:
+        while True:
+            block = stream.read(min(buffer_size, length - written + 1))
+            if not block:
+                break
+            if written + len(block) > length:
+                # Лишние байты не пишем, чтобы не затереть соседний чанк
+                return written + len(block)
+            if hasher is not None:
+                hasher.update(block)
+            view = memoryview(block)
+            while view:
+                n = os.pwrite(fd, view, offset + written)
+                view = view[n:]
+                written += n
+    finally:
+        os.close(fd)
+    return written
+
+
+def commit_target(upload_id, final_path):
+    """Сбрасывает целевой файл на диск и переносит его на итоговое место"""
+    target_path = get_target_path(upload_id)
+    fd = os.open(target_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(target_path, final_path)
+    os.rmdir(get_upload_dir(upload_id))
+
+
+# ==============================
+# 🔹 Склейка чанков
+# ==============================
+# Ошибки, при которых copy_file_range/sendfile не поддерживаются для пары файлов
+_NO_KERNEL_COPY = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+def copy_range(src_fd, dst_fd, dst_offset, size, buffer_size=None, src_offset=0):
+    """
+    Копирует size байт из src_fd (начиная с src_offset) в dst_fd по смещению dst_offset.
+    Сначала пробует копирование внутри ядра (copy_file_range, затем sendfile),
+    при неудаче — буферизованное копирование блоками фиксированного размера.
+    """
+    copied = 0
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - copied, src_offset + copied, dst_offset + copied)
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in _NO_KERNEL_COPY:
+                raise
+
+    if hasattr(os, "sendfile"):
+        try:
+            os.lseek(dst_fd, dst_offset + copied, os.SEEK_SET)
+            while copied < size:
+                n = os.sendfile(dst_fd, src_fd, src_offset + copied, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in _NO_KERNEL_COPY:
+                raise
+
+    buffer_size = buffer_size or get_buffer_size()
+    while copied < size:
+        block = os.pread(src_fd, min(buffer_size, size - copied), src_offset + copied)
+        if not block:
+            break
+        view = memoryview(block)
+        while view:
+            n = os.pwrite(dst_fd, view, dst_offset + copied)
+            view = view[n:]
+            copied += n
+    return copied
+
+
+def merge_chunks(upload_dir, chunk_files, final_path):
+    """
+    Склеивает чанки из upload_dir в final_path без чтения их в память Python
+    и удаляет временную папку. Возвращает размер итогового файла.
+    """
+    offset = 0
+    dst_fd = os.open(final_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        for chunk in chunk_files:
+            src_fd = os.open(os.path.join(upload_dir, chunk), os.O_RDONLY)
+            try:
+                offset += copy_range(src_fd, dst_fd, offset, os.fstat(src_fd).st_size)
+            finally:
+                os.close(src_fd)
+    finally:
+        os.close(dst_fd)
+
+    # В папке могут остаться tmp_chunk_* от оборванных запросов
+    shutil.rmtree(upload_dir, ignore_errors=True)
+    return offset
@@ -1,9 +1,14 @@
 from django.urls import path
 from .views import (
-    ChunkInitAPIView, ChunkUploadAPIView, ChunkCompleteAPIView, FolderCreateAPIView, FolderUpdateAPIView,
-    FolderViewByTokenAPIView, FileViewByTokenAPIView, FileReplaceAPIView, QRCodeAPIView,
+    ChunkInitAPIView, ChunkUploadAPIView, ChunkCompleteAPIView, ChunkJobStatusAPIView,
+    ChunkMissingAPIView, UploadStatsAPIView, FolderCreateAPIView, FolderUpdateAPIView,
+    FolderViewByTokenAPIView, FolderZipAPIView, FileViewByTokenAPIView, FileMediaAPIView,
+    FileHLSAPIView, FileWaveformAPIView, FileThumbnailsAPIView,
+    FileReplaceAPIView, FileManifestAPIView, FileDeltaReplaceAPIView,
+    QRCodeAPIView,
     FileStreamAPIView, FileMoveAPIView, RegisterView, LoginView, UserDetailView, FileUpdateAPIView,
-    FileDeleteAPIView, FolderDeleteAPIView, RootFoldersAPIView, FolderSearchAPIView, FilePreviewAPIView
+    FileDeleteAPIView, FolderDeleteAPIView, RootFoldersAPIView, FolderSearchAPIView, FilePreviewAPIView,
+    FilePreviewPageAPIView,
 )
 
 from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
@@ -15,18 +20,29 @@ urlpatterns = [
     # Chunk upload
     path("api/v3/chunk_init/", ChunkInitAPIView.as_view(), name="chunk-init"),
     path("api/v3/chunk_upload/", ChunkUploadAPIView.as_view(), name="chunk-upload"),
+    path("api/v3/chunk_missing/<str:upload_id>/", ChunkMissingAPIView.as_view(), name="chunk-missing"),
+    path("api/v3/uploads_stats/", UploadStatsAPIView.as_view(), name="uploads-stats"),
     path("api/v3/chunk_complete/", ChunkCompleteAPIView.as_view(), name="chunk-complete"),
+    path("api/v3/chunk_status/<uuid:job_id>/", ChunkJobStatusAPIView.as_view(), name="chunk-status"),
     path("api/v3/folders_search/", FolderSearchAPIView.as_view(), name="folder-search"),    # 3
 
     # Folders
     path("api/v3/folders/", FolderCreateAPIView.as_view(), name="folder-create"),
     path("api/v3/folders/update/", FolderUpdateAPIView.as_view(), name="folder-update"),
     path("api/v3/folders/<str:token>/", FolderViewByTokenAPIView.as_view(), name="folder-view"),
+    path("api/v3/folders_zip/<str:token>/", FolderZipAPIView.as_view(), name="folder-zip"),
 
     # Files
     path("api/v3/files/<str:token>/", FileViewByTokenAPIView.as_view(), name="file-view"),
+    path("api/v3/stream/<str:token>/", FileMediaAPIView.as_view(), name="file-media"),
+    path("api/v3/hls/<str:token>/<str:version>/<path:name>", FileHLSAPIView.as_view(), name="file-hls"),
+    path("api/v3/thumbnails/<str:token>/<str:version>/<str:name>", FileThumbnailsAPIView.as_view(), name="file-thumbnails"),
+    path("api/v3/waveform/<str:token>/<str:version>/<int:level>.dat", FileWaveformAPIView.as_view(), name="file-waveform"),
     path("api/v3/files_replace/<uuid:pk>/", FileReplaceAPIView.as_view(), name="file-replace"),  # 1
+    path("api/v3/files_manifest/<uuid:pk>/", FileManifestAPIView.as_view(), name="file-manifest"),
+    path("api/v3/files_replace_delta/<uuid:pk>/", FileDeltaReplaceAPIView.as_view(), name="file-replace-delta"),
     path('api/v3/files_preview/<str:token>/', FilePreviewAPIView.as_view(), name='file-preview'),  # 2
+    path('api/v3/files_preview/<str:token>/<str:version>/<int:page>.png', FilePreviewPageAPIView.as_view(), name='file-preview-page'),
 
     # QR
     path("api/v3/qr/<str:token>/", QRCodeAPIView.as_view(), name="generate-qr"),
@@ -2,15 +2,30 @@ import os
 import io
 import qrcode
 import uuid
-from django.conf import settings
-from .models import Folder, File, FileUploadSession
-from .serializers import FolderSerializer, FileSerializer
+from .models import Folder, File, FileUploadSession, UploadJob
+from .serializers import FolderSerializer, FileSerializer, folder_tree_context
 from django.templatetags.static import static
-import mimetypes
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.http import JsonResponse
-from django.utils import timezone
 from .permissions import IsAdminOrSuperUserRole
+from .uploads import (
+    save_chunk, get_upload_dir, preallocate_target, write_chunk_at,
+    get_open_session, forget_session, mark_chunk_received, session_removed, hash_file,
+)
+from .jobs import enqueue_finalize, detect_file_type
+from .reaper import check_quota, temp_upload_usage
+from .blobs import (
+    acquire_blob, is_valid_sha256, release_files, store_blob, store_uploaded_file,
+    replace_file_content, incoming_path, derived_key, derived_version,
+)
+from .streaming import MediaContentNegotiation, deliver_file
+from .archive import folder_entries, stream_zip
+from .pagination import KeysetPagination
+from .caching import IMMUTABLE, bump_folder_versions, conditional, make_etag
+from .stats import folder_totals, move_stats
+from .ingest import enqueue_ingest
+from . import hls, previews, signals, thumbnails, waveform
+from .delta import DeltaError, get_block_size, content_sha256, get_manifest, parse_instructions, apply_delta
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
@@ -18,7 +33,10 @@ from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from pdf2image import convert_from_path
+from django.urls import reverse
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
 
 
 User = get_user_model()
@@ -130,24 +148,59 @@ class FolderCreateAPIView(APIView):
         return Response(serializer.errors, status=400)
 
 
+def folder_validators(request, token):
+    row = Folder.objects.filter(token=token).values_list("pk", "version", "updated_at").first()
+    if row is None:
+        return None
+    pk, version, updated_at = row
+    # В ответе абсолютные ссылки на постеры — адрес сервера тоже входит в ETag
+    return make_etag("folder", request.get_host(), pk, version), updated_at
+
+
 class FolderViewByTokenAPIView(APIView):
     """Просмотр содержимого папки по токену"""
+    @conditional(folder_validators)
     def get(self, request, token):
         try:
             folder = Folder.objects.get(token=token)
         except Folder.DoesNotExist:
             return Response({'error': 'Folder not found'}, status=404)
 
-        subfolders = Folder.objects.filter(parent=folder)
-        files = File.objects.filter(folder=folder)
+        # Поддерево — один запрос по пути, дерево собирается в памяти
+        tree = list(folder.descendants())
+        context = folder_tree_context(tree, [folder], request=request)
+        subfolders = context['children'].get(folder.pk, [])
+        files = context['files_by_folder'].get(folder.pk, [])
 
         return Response({
-            'folder': FolderSerializer(folder).data,
-            'subfolders': FolderSerializer(subfolders, many=True).data,
-            'files': FileSerializer(files, many=True).data
+            'folder': FolderSerializer(folder, context=context).data,
+            'breadcrumbs': [
+                {'id': f.id, 'name': f.name, 'token': f.token}
+                for f in [*folder.ancestors(), folder]
+            ],
+            'subfolders': FolderSerializer(subfolders, many=True, context=context).data,
+            'files': FileSerializer(files, many=True, context=context).data
         })
 
 
+class FolderZipAPIView(APIView):
+    """
+    Всё поддерево папки одним ZIP-архивом, который собирается на лету:
+    без временных файлов, с постоянной памятью, первые байты уходят сразу
+    """
+    content_negotiation_class = MediaContentNegotiation
+
+    def get(self, request, token):
+        folder = get_object_or_404(Folder, token=token)
+        entries = folder_entries(folder)
+
+        response = StreamingHttpResponse(stream_zip(entries), content_type="application/zip")
+        response["Content-Disposition"] = content_disposition_header(True, f"{folder.name}.zip")
+        # nginx не должен копить ответ в буфере — архив идёт клиенту по мере сборки
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 # views.py
 class FolderUpdateAPIView(APIView):
     permission_classes = [IsAdminOrSuperUserRole]
@@ -172,21 +225,36 @@ class FolderUpdateAPIView(APIView):
                 folder.parent = None
             else:
                 try:
-                    folder.parent = Folder.objects.get(pk=parent_id)
+                    parent = Folder.objects.get(pk=parent_id)
                 except Folder.DoesNotExist:
                     return Response({"error": "Parent folder not found"}, status=404)
+                # Цикл виден по путям, без обхода дерева
+                if parent.is_inside(folder):
+                    return Response({"error": "Cannot move folder into itself or its subfolder"}, status=400)
+                folder.parent = parent
 
-        folder.save()
+        try:
+            folder.save()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
         return Response(FolderSerializer(folder).data, status=200)
 
 
 # ==============================
 # 🔹 QR-коды
 # ==============================
+def qr_validators(request, token):
+    # PNG зависит только от токена и адреса сервера, поэтому неизменен
+    if not File.objects.filter(token=token).exists() and not Folder.objects.filter(token=token).exists():
+        return None
+    return make_etag("qr", request.get_host(), token), None
+
+
 class QRCodeAPIView(APIView):
     """
     Генерация QR-кода по токену (файла или папки)
     """
+    @conditional(qr_validators, IMMUTABLE)
     def get(self, request, token):
         try:
             obj = File.objects.get(token=token)
@@ -237,15 +305,84 @@ class ChunkInitAPIView(APIView):
             if not folder:
                 return Response({"error": "Папка не найдена"}, status=404)
 
+        # 🔹 Клиент может заранее прислать SHA-256: уже известное содержимое
+        # прикрепляется сразу, без передачи байтов
+        sha256 = (request.data.get("sha256") or "").lower() or None
+        if sha256:
+            if not is_valid_sha256(sha256):
+                return Response({"error": "sha256 должен быть hex-строкой из 64 символов"}, status=400)
+            with transaction.atomic():
+                blob = acquire_blob(sha256)
+                if blob:
+                    file_obj = File.objects.create(
+                        folder=folder,
+                        name=file_name,
+                        file=blob.file.name,
+                        blob=blob,
+                        file_type=detect_file_type(file_name),
+                        size=blob.size,
+                    )
+                    enqueue_ingest(file_obj)
+            if blob:
+                return Response(
+                    {
+                        "message": "Файл с таким содержимым уже есть, загрузка не нужна",
+                        "deduplicated": True,
+                        "file_id": str(file_obj.id),
+                        "file": FileSerializer(file_obj).data,
+                    },
+                    status=201,
+                )
+
+        # 🔹 Необязательные размеры: включают запись чанков сразу в целевой файл
+        total_size = request.data.get("total_size")
+        chunk_size = request.data.get("chunk_size")
+        if total_size or chunk_size:
+            try:
+                total_size, chunk_size = int(total_size), int(chunk_size)
+            except (TypeError, ValueError):
+                total_size = chunk_size = 0
+            if total_size <= 0 or chunk_size <= 0:
+                return Response(
+                    {"error": "total_size и chunk_size должны быть положительными числами"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if -(-total_size // chunk_size) != int(total_chunks):
+                return Response(
+                    {"error": "total_chunks не соответствует total_size и chunk_size"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            total_size = chunk_size = None
+
+        # 🔹 Квота на временные данные загрузок
+        quota_error = check_quota(total_size or 0)
+        if quota_error:
+            return Response({"error": quota_error}, status=status.HTTP_507_INSUFFICIENT_STORAGE)
+
         upload_id = str(uuid.uuid4())
         session = FileUploadSession.objects.create(
             folder=folder,
             upload_id=upload_id,
             total_chunks=int(total_chunks),
+            received_bitmap=bytes((int(total_chunks) + 7) // 8),
+            total_size=total_size,
+            chunk_size=chunk_size,
+            sha256=sha256,
             file_name=file_name,
         )
+        if session.is_preallocated:
+            preallocate_target(upload_id, total_size)
+
         return Response(
-            {"upload_id": upload_id, "total_chunks": total_chunks, "file_name": file_name},
+            {
+                "upload_id": upload_id,
+                "total_chunks": total_chunks,
+                "file_name": file_name,
+                "total_size": total_size,
+                "chunk_size": chunk_size,
+                "deduplicated": False,
+            },
             status=201,
         )
 
@@ -255,7 +392,7 @@ class ChunkUploadAPIView(APIView):
     2️⃣ Приём чанков
     Headers:
       X-Upload-ID, X-Chunk-Index
-    Body: бинарные данные
+    Body: бинарные данные (пишутся на диск потоково)
     """
     permission_classes = [IsAdminOrSuperUserRole]
 
@@ -269,41 +406,131 @@ class ChunkUploadAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        session = FileUploadSession.objects.filter(upload_id=upload_id, is_complete=False).first()
+        try:
+            chunk_index = int(chunk_index)
+        except (TypeError, ValueError):
+            chunk_index = -1
+        if chunk_index < 0:
+            return Response(
+                {"error": "X-Chunk-Index должен быть неотрицательным целым числом"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        entry = get_open_session(upload_id)
+        if not entry:
+            return Response({"error": "Сессия не найдена или завершена"}, status=404)
+        session = entry.session
+
+        if chunk_index >= session.total_chunks:
+            return Response({"error": "Номер чанка вне диапазона"}, status=400)
+
+        # Тело читается из входного потока блоками CHUNK_UPLOAD_BUFFER_SIZE,
+        # request.body не трогаем — иначе весь чанк окажется в памяти
+        stream = request.stream or io.BytesIO()
+        # SHA-256 считается попутно, если чанк пришёл по порядку
+        sha = entry.hasher.begin(chunk_index)
+        content_length = request.META.get("CONTENT_LENGTH")
+        if session.is_preallocated:
+            offset, length = session.get_chunk_span(chunk_index)
+            if content_length and int(content_length) != length:
+                return Response(
+                    {"error": f"Ожидалось {length} байт для чанка {chunk_index}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            try:
+                received = write_chunk_at(upload_id, offset, stream, length, hasher=sha)
+            except FileNotFoundError:
+                # Целевой файл уже перенесён — сессию завершили в другом процессе
+                forget_session(upload_id)
+                return Response({"error": "Сессия не найдена или завершена"}, status=404)
+            if received != length:
+                return Response(
+                    {"error": f"Ожидалось {length} байт для чанка {chunk_index}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            if session_removed(entry):
+                return Response({"error": "Сессия не найдена или завершена"}, status=404)
+            # Оборванная передача (байт меньше Content-Length) не отмечается полученной
+            expected = int(content_length) if content_length else None
+            try:
+                length = save_chunk(upload_id, chunk_index, stream, hasher=sha, expected_length=expected)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if sha is not None:
+            entry.hasher.commit(chunk_index, sha, length)
+
+        # 🔹 Отмечаем чанк в битовой карте; повторная отправка ничего не меняет
+        session = mark_chunk_received(entry, chunk_index, length)
         if not session:
             return Response({"error": "Сессия не найдена или завершена"}, status=404)
 
-        temp_dir = os.path.join(settings.MEDIA_ROOT, "temp_uploads", upload_id)
-        os.makedirs(temp_dir, exist_ok=True)
+        return Response({
+            "message": f"Чанк {chunk_index} загружен",
+            "received_chunks": session.received_chunks,
+            "total_chunks": session.total_chunks,
+        })
+
+
+class ChunkMissingAPIView(APIView):
+    """
+    Недостающие чанки сессии — чтобы клиент мог продолжить загрузку после обрыва
+    Ответ: missing — список диапазонов [start, end] включительно
+    """
+    permission_classes = [IsAdminOrSuperUserRole]
+
+    def get(self, request, upload_id):
+        session = FileUploadSession.objects.filter(upload_id=upload_id).first()
+        if not session:
+            return Response({"error": "Сессия не найдена"}, status=404)
+
+        return Response({
+            "upload_id": session.upload_id,
+            "total_chunks": session.total_chunks,
+            "received_chunks": session.received_chunks,
+            "is_complete": session.is_complete,
+            "missing": session.missing_ranges(),
+        })
 
-        chunk_path = os.path.join(temp_dir, f"chunk_{chunk_index}")
-        with open(chunk_path, "wb") as f:
-            f.write(request.body)
 
-        session.received_chunks += 1
-        session.save(update_fields=["received_chunks"])
+class UploadStatsAPIView(APIView):
+    """
+    Живые итоги по временным данным загрузок: открытые сессии, байты и квота
+    """
+    permission_classes = [IsAdminOrSuperUserRole]
 
-        return Response({"message": f"Чанк {chunk_index} загружен"})
+    def get(self, request):
+        return Response(temp_upload_usage())
 
 
 class ChunkCompleteAPIView(APIView):
     permission_classes = [IsAdminOrSuperUserRole]
 
     """
-    3️⃣ Завершение загрузки, склейка и сохранение файла в модель File
+    3️⃣ Завершение загрузки: ставит склейку и сохранение файла в модель File
+    в фоновую очередь и сразу возвращает 202 с job_id
     """
     def post(self, request):
         upload_id = request.data.get("upload_id")
-        file_name = request.data.get("file_name", "merged_file.bin")
         folder_id = request.data.get("folder_id")  # новый параметр
 
         if not upload_id:
             return JsonResponse({"error": "upload_id обязателен"}, status=400)
 
-        session = FileUploadSession.objects.filter(upload_id=upload_id, is_complete=False).first()
+        session = FileUploadSession.objects.filter(upload_id=upload_id).first()
+        if session and session.is_complete:
+            # Повторный вызов, пока задача ещё выполняется, возвращает ту же задачу
+            job = session.jobs.filter(
+                status__in=[UploadJob.STATUS_QUEUED, UploadJob.STATUS_MERGING]
+            ).first()
+            if job:
+                return JsonResponse(self._job_payload(request, job), status=202)
+            session = None
         if not session:
             return JsonResponse({"error": "Сессия не найдена или уже завершена"}, status=404)
 
+        file_name = request.data.get("file_name") or session.file_name or "merged_file.bin"
+
         # 🔹 Если указан folder_id, получаем папку
         folder = session.folder
         if folder_id:
@@ -311,81 +538,84 @@ class ChunkCompleteAPIView(APIView):
             if not folder:
                 return JsonResponse({"error": "Папка с таким UUID не найдена"}, status=404)
 
-        upload_dir = os.path.join(settings.MEDIA_ROOT, "temp_uploads", upload_id)
+        upload_dir = get_upload_dir(upload_id)
         if not os.path.exists(upload_dir):
             return JsonResponse({"error": "временные чанки не найдены"}, status=404)
 
-        # 🔹 Сортировка chunk_0, chunk_1, ...
-        chunk_files = sorted(
-            [f for f in os.listdir(upload_dir) if f.startswith("chunk_")],
-            key=lambda x: int(x.split("_")[-1])
-        )
-        if not chunk_files:
-            return JsonResponse({"error": "чанков нет"}, status=400)
-
-        # 🔹 Путь финального файла
-        final_name = f"{uuid.uuid4().hex}_{file_name}"
-        final_dir = os.path.join(settings.MEDIA_ROOT, "uploads", timezone.now().strftime("%Y/%m/%d"))
-        os.makedirs(final_dir, exist_ok=True)
-        final_path = os.path.join(final_dir, final_name)
-
-        # 🔹 Склейка
-        with open(final_path, "wb") as outfile:
-            for chunk in chunk_files:
-                with open(os.path.join(upload_dir, chunk), "rb") as infile:
-                    outfile.write(infile.read())
-
-        # 🔹 Очистка временных файлов
-        for chunk in chunk_files:
-            os.remove(os.path.join(upload_dir, chunk))
-        os.rmdir(upload_dir)
-
-        # 🔹 MIME-тип
-        mime_type, _ = mimetypes.guess_type(final_path)
-        file_type = "other"
-        if mime_type:
-            if mime_type.startswith("audio"):
-                file_type = "audio"
-            elif mime_type.startswith("video"):
-                file_type = "video"
-            elif mime_type.startswith("image"):
-                file_type = "image"
-            elif mime_type in ["application/pdf", "text/plain"]:
-                file_type = "document"
-
-        # 🔹 Создание записи в модели File
-        file_obj = File.objects.create(
-            folder=folder,
-            name=file_name,
-            file=os.path.relpath(final_path, settings.MEDIA_ROOT),
-            file_type=file_type,
-            size=os.path.getsize(final_path),
-        )
+        if session.received_chunks < session.total_chunks:
+            return JsonResponse(
+                {"error": "получены не все чанки", "missing": session.missing_ranges()},
+                status=400,
+            )
 
-        # 🔹 Завершаем сессию
-        session.is_complete = True
-        session.save(update_fields=["is_complete"])
-
-        # 🔹 Сериализация файла
-        file_data = FileSerializer(file_obj).data
-
-        # 🔹 Итоговый ответ
-        return JsonResponse({
-            "message": "✅ Файл успешно загружен и сохранён",
-            "file_id": str(file_obj.id),
-            "file_type": file_type,
-            "file_url": f"/media/{file_obj.file}",
-            "folder_id": str(folder.id) if folder else None,
-            "file": file_data,  # 🔥 добавлено поле file
-        })
+        # 🔹 Закрываем сессию для новых чанков; побеждает только один параллельный вызов
+        claimed = FileUploadSession.objects.filter(pk=session.pk, is_complete=False).update(is_complete=True)
+        if not claimed:
+            return JsonResponse({"error": "Сессия не найдена или уже завершена"}, status=404)
+        entry = forget_session(upload_id)
+
+        job = UploadJob.objects.create(session=session, folder=folder, file_name=file_name)
+        enqueue_finalize(job, entry.hasher if entry else None)
+
+        return JsonResponse(self._job_payload(request, job), status=202)
+
+    @staticmethod
+    def _job_payload(request, job):
+        return {
+            "message": "Файл поставлен в очередь на сборку",
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": request.build_absolute_uri(
+                reverse("chunk-status", kwargs={"job_id": job.id})
+            ),
+        }
+
+
+class ChunkJobStatusAPIView(APIView):
+    """
+    4️⃣ Статус фоновой сборки файла: queued, merging, done или failed
+    """
+    permission_classes = [IsAdminOrSuperUserRole]
+
+    def get(self, request, job_id):
+        job = UploadJob.objects.select_related("file").filter(pk=job_id).first()
+        if not job:
+            return JsonResponse({"error": "Задача не найдена"}, status=404)
+
+        data = {
+            "job_id": str(job.id),
+            "status": job.status,
+            "error": job.error or None,
+            "folder_id": str(job.folder_id) if job.folder_id else None,
+            "file_id": None,
+            "file": None,
+        }
+        if job.file:
+            data.update({
+                "file_id": str(job.file.id),
+                "file_type": job.file.file_type,
+                "file_url": f"/media/{job.file.file}",
+                "file": FileSerializer(job.file).data,
+            })
+        return JsonResponse(data)
 
 
 # ==============================
 # 🔹 Просмотр файла по токену
 # ==============================
+def file_validators(request, token):
+    row = File.objects.filter(token=token).values_list("pk", "updated_at", "blob_id").first()
+    if row is None:
+        return None
+    pk, updated_at, blob_id = row
+    # В ответе абсолютные ссылки — адрес сервера тоже входит в ETag
+    return make_etag(request.path, request.get_host(), pk, updated_at, blob_id), updated_at
+
+
 class FileViewByTokenAPIView(APIView):
     """Просмотр файла по токену (без логики одноразового просмотра)"""
 
+    @conditional(file_validators)
     def get(self, request, token):
         try:
             file = File.objects.get(token=token)
@@ -395,14 +625,126 @@ class FileViewByTokenAPIView(APIView):
         # Просто возвращаем данные без проверки viewed
         data = FileSerializer(file).data
         data['view_url'] = request.build_absolute_uri()
-        data['download_url'] = request.build_absolute_uri(file.file.url if file.file else static('no_file.png'))
+        stream_url = request.build_absolute_uri(reverse('file-media', args=[file.token]))
+        data['download_url'] = f"{stream_url}?download=1" if file.file else request.build_absolute_uri(static('no_file.png'))
+        data['stream_url'] = stream_url
+
+        # 🔹 Адаптивный поток, если видео уже упаковано в HLS
+        if artifact_ready(file, 'hls'):
+            data['hls_url'] = request.build_absolute_uri(
+                reverse('file-hls', args=[file.token, derived_version(file), hls.MASTER_PLAYLIST])
+            )
+            data['renditions'] = list(
+                file.renditions.values('name', 'width', 'height', 'bandwidth')
+            )
+
+        # 🔹 Пики волновой формы для аудио: ссылка на каждый уровень масштаба
+        if artifact_ready(file, 'waveform'):
+            meta = file.artifacts['waveform']
+            data['waveform'] = {
+                'sample_rate': meta['sample_rate'],
+                'levels': {
+                    level: request.build_absolute_uri(
+                        reverse('file-waveform', args=[file.token, derived_version(file), level])
+                    )
+                    for level in meta['levels']
+                },
+            }
 
         return Response(data, status=200)
 
 
+class FileMediaAPIView(APIView):
+    """
+    Содержимое файла по токену с поддержкой Range (перемотка в плеерах).
+    ?download=1 — отдать как вложение. При MEDIA_DELIVERY_MODE x-accel/x-sendfile
+    байты отдаёт веб-сервер, Django только находит файл.
+    """
+    content_negotiation_class = MediaContentNegotiation
+
+    def get(self, request, token):
+        file = get_object_or_404(File, token=token)
+        if not file.file or not os.path.exists(file.file.path):
+            raise Http404("Файл отсутствует в хранилище")
+
+        return deliver_file(
+            request,
+            file.file.path,
+            filename=file.name,
+            as_attachment=request.query_params.get('download') in ('1', 'true'),
+        )
+
+
+def artifact_ready(file, name):
+    return file.artifacts.get(name, {}).get('status') == 'ready'
+
+
+def derived_file_response(request, token, version, artifact, root_func, name, content_types):
+    """
+    Отдаёт файл производного артефакта по токену. version в URL привязан к
+    содержимому — ответы неизменны и кэшируются навсегда
+    """
+    file = get_object_or_404(File, token=token)
+    if version != derived_version(file) or not artifact_ready(file, artifact):
+        raise Http404("Для этой версии файла артефакта нет")
+
+    root = os.path.realpath(root_func(derived_key(file)))
+    path = os.path.realpath(os.path.join(root, name))
+    ext = os.path.splitext(path)[1]
+    if not path.startswith(root + os.sep) or ext not in content_types or not os.path.isfile(path):
+        raise Http404("Нет такого файла")
+
+    response = deliver_file(request, path, content_type=content_types[ext])
+    patch_cache_control(response, **IMMUTABLE)
+    return response
+
+
+class FileHLSAPIView(APIView):
+    """Мастер-плейлист, плейлисты уровней и сегменты HLS по токену файла"""
+    content_negotiation_class = MediaContentNegotiation
+
+    def get(self, request, token, version, name):
+        return derived_file_response(request, token, version, 'hls', hls.hls_dir, name, hls.CONTENT_TYPES)
+
+
+class FileThumbnailsAPIView(APIView):
+    """Постер, спрайт-лист кадров и его индекс WebVTT по токену файла"""
+    content_negotiation_class = MediaContentNegotiation
+
+    def get(self, request, token, version, name):
+        return derived_file_response(
+            request, token, version, 'thumbnails', thumbnails.thumbnails_dir, name, thumbnails.CONTENT_TYPES,
+        )
+
+
+class FileWaveformAPIView(APIView):
+    """Пики волновой формы аудио (.dat v1, 8 бит) для уровня samples_per_peak"""
+    content_negotiation_class = MediaContentNegotiation
+
+    def get(self, request, token, version, level):
+        return derived_file_response(
+            request, token, version, 'waveform', waveform.waveform_dir,
+            f"{level}.dat", {".dat": waveform.CONTENT_TYPE},
+        )
+
+
 # ==============================
 # 🔹 Замена файла без смены токена
 # ==============================
+def file_type_by_extension(name):
+    """Определяем тип файла по расширению"""
+    ext = os.path.splitext(name)[1].lower()
+    if ext in ['.mp3', '.wav', '.flac']:
+        return 'audio'
+    elif ext in ['.mp4', '.avi', '.mov', '.mkv']:
+        return 'video'
+    elif ext in ['.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx']:
+        return 'document'
+    elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']:
+        return 'image'
+    return 'document'  # по умолчанию документ
+
+
 class FileReplaceAPIView(APIView):
     permission_classes = [IsAdminOrSuperUserRole]
 
@@ -424,41 +766,147 @@ class FileReplaceAPIView(APIView):
         if not new_file:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Удаляем старый файл с диска
-        if file.file:
-            file.file.delete(save=False)
-
-        # Определяем тип файла по расширению
-        ext = os.path.splitext(new_file.name)[1].lower()
-        if ext in ['.mp3', '.wav', '.flac']:
-            file_type = 'audio'
-        elif ext in ['.mp4', '.avi', '.mov', '.mkv']:
-            file_type = 'video'
-        elif ext in ['.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx']:
-            file_type = 'document'
-        elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']:
-            file_type = 'image'
-        else:
-            file_type = 'document'  # по умолчанию документ
+        with transaction.atomic():
+            # Новое содержимое кладём в хранилище blob'ов (повтор уже известного не занимает места),
+            # старое освобождается — с диска удаляется, если ссылок больше нет
+            blob = store_uploaded_file(new_file)
+            # Тип по сигнатуре содержимого (считается обработчиком загрузки), иначе по расширению
+            file_type = getattr(new_file, "file_type", None) or file_type_by_extension(new_file.name)
+            replace_file_content(file, blob, new_file.name, file_type)
+            enqueue_ingest(file)
+
+        return Response(FileSerializer(file).data, status=status.HTTP_200_OK)
+
+
+class FileManifestAPIView(APIView):
+    """
+    Манифест хэшей блоков текущей версии файла — первый шаг дельта-замены
+    GET /api/v3/files_manifest/<uuid:pk>/?block_size=1048576
+    """
+    permission_classes = [IsAdminOrSuperUserRole]
+
+    def get(self, request, pk):
+        file = get_object_or_404(File, pk=pk)
+        try:
+            block_size = get_block_size(request.query_params.get("block_size"))
+        except DeltaError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "file_id": str(file.id),
+            "sha256": content_sha256(file),
+            "size": file.size,
+            "block_size": block_size,
+            "blocks": get_manifest(file, block_size),
+        })
+
 
-        # Обновляем поля
-        file.file = new_file
-        file.name = new_file.name
-        file.size = getattr(new_file, "size", None)
-        file.file_type = file_type
-        file.save()
+class FileDeltaReplaceAPIView(APIView):
+    """
+    Дельта-замена файла без смены токена: клиент присылает только изменившиеся байты
+    PUT /api/v3/files_replace_delta/<uuid:pk>/
+    Content-Type: multipart/form-data
+      base_sha256=<sha256 версии, по которой строился манифест>
+      block_size=<размер блока манифеста>
+      instructions=[{"op": "copy", "block": 0, "count": 120}, {"op": "data", "length": 524288}, ...]
+      data=<новые байты подряд, в порядке операций data>
+      name=<новое имя> (необязательно), sha256=<ожидаемый хэш результата> (необязательно)
+    """
+    permission_classes = [IsAdminOrSuperUserRole]
+
+    def put(self, request, pk):
+        file = get_object_or_404(File, pk=pk)
+
+        try:
+            block_size = get_block_size(request.data.get("block_size"))
+            instructions = parse_instructions(request.data.get("instructions"))
+        except DeltaError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        base_sha256 = request.data.get("base_sha256")
+        if base_sha256 != content_sha256(file):
+            return Response(
+                {"error": "Файл изменился, запросите манифест заново"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        data = request.FILES.get("data")
+        assembled_path = incoming_path()
+        try:
+            apply_delta(file.file.path, instructions, data, block_size, assembled_path)
+            sha256 = hash_file(assembled_path).hexdigest()
+            expected = request.data.get("sha256")
+            if expected and expected.lower() != sha256:
+                raise DeltaError(f"SHA-256 результата {sha256} не совпадает с ожидаемым")
+        except DeltaError as e:
+            os.remove(assembled_path)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except FileNotFoundError:
+            # Старую версию уже заменили и удалили с диска
+            return Response(
+                {"error": "Файл изменился, запросите манифест заново"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        name = request.data.get("name") or file.name
+        with transaction.atomic():
+            # Проверка выше шла без блокировки: параллельная замена могла
+            # успеть раньше — тогда дельта построена по устаревшей версии
+            current = File.objects.select_for_update().get(pk=file.pk)
+            if current.blob_id != file.blob_id or current.file.name != file.file.name:
+                os.remove(assembled_path)
+                return Response(
+                    {"error": "Файл изменился, запросите манифест заново"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            file = current
+            blob = store_blob(assembled_path, sha256, os.path.splitext(name)[1])
+            replace_file_content(file, blob, name, file_type_by_extension(name))
+            enqueue_ingest(file)
 
         return Response(FileSerializer(file).data, status=status.HTTP_200_OK)
 
 
 class FileStreamAPIView(APIView):
-    """Отдаёт файл с корректным Content-Type"""
+    """
+    Список файлов постранично (по ключу created_at, id — без OFFSET).
+    ?file_type= и ?folder=<token>|root (&recursive=1 — со всем поддеревом)
+    фильтруют, ?fields=id,name,... — только нужные поля
+    """
     permission_classes = [IsAdminOrSuperUserRole]
 
     def get(self, request):
-        files = File.objects.select_related('folder').order_by('-created_at')
-        serializer = FileSerializer(files, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        files = File.objects.all()
+
+        file_type = request.query_params.get('file_type')
+        if file_type:
+            files = files.filter(file_type=file_type)
+
+        folder_token = request.query_params.get('folder')
+        if folder_token == 'root':
+            files = files.filter(folder__isnull=True)
+        elif folder_token:
+            folder = Folder.objects.filter(token=folder_token).only('path').first()
+            if folder is None:
+                return Response({'error': 'Folder not found'}, status=404)
+            if request.query_params.get('recursive') in ('1', 'true'):
+                files = files.filter(folder__path__startswith=folder.path)
+            else:
+                files = files.filter(folder=folder)
+
+        fields = [f for f in request.query_params.get('fields', '').split(',') if f]
+        unknown = set(fields) - set(FileSerializer.Meta.fields)
+        if unknown:
+            return Response({'error': f"Неизвестные поля: {', '.join(sorted(unknown))}"}, status=400)
+
+        paginator = KeysetPagination()
+        try:
+            page = paginator.paginate_queryset(files, request, view=self)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        serializer = FileSerializer(page, many=True, context={'fields': fields})
+        return paginator.get_paginated_response(serializer.data)
 
 
 class FileMoveAPIView(APIView):
@@ -511,56 +959,75 @@ class FileDeleteAPIView(APIView):
 
     def delete(self, request, pk):
         file_obj = get_object_or_404(File, pk=pk)
-        file_obj.file.delete(save=False)  # удаляем физический файл
+        # Физический файл удаляется, если на него больше нет ссылок (сигнал post_delete)
         file_obj.delete()
         return Response({"message": "Файл успешно удалён"}, status=status.HTTP_200_OK)
 
 
 class FilePreviewAPIView(APIView):
     """
-    Конвертирует все страницы PDF-файла в PNG и возвращает ссылки на них
+    Ссылки на PNG-превью страниц PDF. Без параметров ничего не рендерится:
+    страницы рендерятся при первом запросе картинки. ?page=N или
+    ?first_page=A&last_page=B ограничивают список и заранее дорендеривают
+    недостающие страницы диапазона одним вызовом
     """
+    @conditional(file_validators)
     def get(self, request, token):
         try:
             file = File.objects.get(token=token)
         except File.DoesNotExist:
             return Response({'error': 'File not found'}, status=404)
 
-        if not file.file.name.lower().endswith('.pdf'):
+        if not previews.is_pdf(file):
             return Response({'error': 'File is not PDF'}, status=400)
 
-        pdf_path = file.file.path
-        preview_dir = os.path.join(settings.MEDIA_ROOT, 'previews')
-        os.makedirs(preview_dir, exist_ok=True)
-
-        # Формируем имена PNG для каждой страницы
-        preview_urls = []
-
         try:
-            # Конвертируем все страницы PDF
-            images = convert_from_path(pdf_path, dpi=200)
-            for i, image in enumerate(images, start=1):
-                preview_name = f"{file.token}_page_{i}.png"
-                preview_path = os.path.join(preview_dir, preview_name)
-
-                # Если не существует — сохраняем
-                if not os.path.exists(preview_path):
-                    image.save(preview_path, 'PNG')
-
-                # Добавляем ссылку
-                preview_url = request.build_absolute_uri(
-                    os.path.join(settings.MEDIA_URL, 'previews', preview_name)
-                )
-                preview_urls.append(preview_url)
+            page_count = previews.get_page_count(file)
+            first, last, explicit = previews.parse_page_range(request.query_params, page_count)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         except Exception as e:
             return Response({'error': f'Ошибка конвертации: {str(e)}'}, status=500)
 
-        data = FileSerializer(file).data
-        data['view_urls'] = preview_urls  # 👈 список всех страниц
+        if explicit:
+            try:
+                previews.ensure_pages(file, derived_key(file), first, last)
+            except Exception as e:
+                return Response({'error': f'Ошибка конвертации: {str(e)}'}, status=500)
+
+        version = derived_version(file)
+        data = FileSerializer(file, context={'request': request}).data
+        data['first_page'], data['last_page'] = first, last
+        data['view_urls'] = [  # 👈 ссылки на страницы диапазона
+            request.build_absolute_uri(reverse('file-preview-page', args=[file.token, version, page]))
+            for page in range(first, last + 1)
+        ]
 
         return Response(data)
 
 
+class FilePreviewPageAPIView(APIView):
+    """
+    PNG одной страницы PDF: из кэша, а если её ещё нет — рендерится только она.
+    version в URL привязан к содержимому — ответ кэшируется навсегда
+    """
+    content_negotiation_class = MediaContentNegotiation
+
+    def get(self, request, token, version, page):
+        file = get_object_or_404(File, token=token)
+        if version != derived_version(file) or not previews.is_pdf(file):
+            raise Http404("Превью для этой версии файла нет")
+        if not 1 <= page <= previews.get_page_count(file):
+            raise Http404("Нет такой страницы")
+
+        key = derived_key(file)
+        previews.ensure_pages(file, key, page, page)
+
+        response = deliver_file(request, previews.page_path(key, page), content_type="image/png")
+        patch_cache_control(response, **IMMUTABLE)
+        return response
+
+
 # 🔹 Удаление папки вместе со всеми файлами и под-папками
 class FolderDeleteAPIView(APIView):
     permission_classes = [IsAdminOrSuperUserRole]
@@ -568,19 +1035,19 @@ class FolderDeleteAPIView(APIView):
     def delete(self, request, pk):
         folder = get_object_or_404(Folder, pk=pk)
 
-        # рекурсивное удаление всех файлов и подпапок
-        def delete_folder_recursive(f):
-            # удаляем все файлы
-            for file_obj in f.files.all():
-                file_obj.file.delete(save=False)
-                file_obj.delete()
-            # рекурсивно удаляем подпапки
-            for subfolder in f.subfolders.all():
-                delete_folder_recursive(subfolder)
-            # удаляем саму папку
-            f.delete()
-
-        delete_folder_recursive(folder)
+        # Всё поддерево — по пути папки, удаление — массовыми запросами,
+        # а файлы с диска удаляет фоновая очередь после коммита
+        subtree = Folder.objects.filter(path__startswith=folder.path)
+        files = File.objects.filter(folder__in=subtree)
+        with transaction.atomic():
+            released = list(files.values_list("pk", "blob_id", "file"))
+            # Итоги поддерева уходят из предков одним UPDATE, до удаления
+            move_stats(folder.ancestor_ids(), (), folder_totals(folder.pk))
+            with signals.suspended():
+                files.delete()
+                subtree.delete()
+            release_files(released)
+            bump_folder_versions(folder.parent_id)
         return Response({"message": "Папка и все вложения успешно удалены"}, status=status.HTTP_200_OK)
 
 
@@ -620,12 +1087,26 @@ class FolderSearchAPIView(APIView):
 # views.py
 class RootFoldersAPIView(APIView):
     """
-    Получение всей иерархии папок с файлами, начиная с root (parent=None)
+    Получение всей иерархии папок с файлами, начиная с root (parent=None).
+    Дерево собирается в памяти: один запрос папок и один запрос файлов
+    при любом размере иерархии.
+    ?depth=N — не глубже N уровней под-папок, ?include_files=0 — без файлов
     """
     permission_classes = [IsAdminOrSuperUserRole]  # или AllowAny, если нет ограничений
 
     def get(self, request):
-        root_folders = Folder.objects.filter(parent__isnull=True)
-        serializer = FolderSerializer(root_folders, many=True)
+        depth = request.query_params.get('depth')
+        try:
+            depth = int(depth) if depth not in (None, '') else None
+        except ValueError:
+            depth = -1
+        if depth is not None and depth < 0:
+            return Response({'error': 'depth должен быть неотрицательным целым'}, status=400)
+        include_files = request.query_params.get('include_files', '1').lower() not in ('0', 'false', 'no')
+
+        folders = list(Folder.objects.all())
+        root_folders = [folder for folder in folders if folder.parent_id is None]
+        context = folder_tree_context(folders, root_folders, depth, include_files, request=request)
+        serializer = FolderSerializer(root_folders, many=True, context=context)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -0,0 +1,139 @@
+"""
+Пики волновой формы аудио (min/max) на нескольких уровнях масштаба.
+Формат — audiowaveform .dat v1 (8 бит), его понимает peaks.js и аналоги.
+"""
+import os
+import json
+import uuid
+import shutil
+import struct
+import subprocess
+import numpy as np
+from django.conf import settings
+from . import ffmpeg
+from .blobs import derived_dir
+
+
+DEFAULT_SAMPLE_RATE = 44100
+# Отсчётов на пару min/max; каждый уровень кратен первому
+DEFAULT_ZOOM_LEVELS = [256, 1024, 4096]
+
+META_FILE = "waveform.json"
+CONTENT_TYPE = "application/octet-stream"
+# Заголовок .dat v1: version, flags (1 — 8 бит), sample_rate, samples_per_pixel, length
+HEADER = struct.Struct("<iIiiI")
+
+
+def waveform_dir(key):
+    return os.path.join(derived_dir(key), "waveform")
+
+
+def get_zoom_levels():
+    levels = sorted(getattr(settings, "WAVEFORM_ZOOM_LEVELS", DEFAULT_ZOOM_LEVELS))
+    if any(level % levels[0] for level in levels):
+        raise ValueError("WAVEFORM_ZOOM_LEVELS должны быть кратны наименьшему уровню")
+    return levels
+
+
+def iter_pcm(path, sample_rate, block_samples):
+    """Декодирует файл в моно int16 и отдаёт numpy-массивы по block_samples отсчётов"""
+    cmd = [
+        ffmpeg.get_binary("ffmpeg"), "-hide_banner", "-nostdin", "-loglevel", "error",
+        "-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            raw = process.stdout.read(block_samples * 2)
+            if not raw:
+                break
+            yield np.frombuffer(raw[:len(raw) // 2 * 2], dtype="<i2")
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise ffmpeg.FFmpegError(stderr.decode(errors="replace")[-2000:] or f"код {process.returncode}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def compute_peaks(blocks, samples_per_peak):
+    """
+    Пики самого мелкого уровня: min и max каждого окна в samples_per_peak
+    отсчётов. Блоки склеиваются с остатком предыдущего, чтобы окна не рвались.
+    """
+    mins, maxs = [], []
+    carry = np.empty(0, dtype="<i2")
+    for block in blocks:
+        samples = np.concatenate((carry, block)) if carry.size else block
+        whole = samples.size // samples_per_peak * samples_per_peak
+        if whole:
+            windows = samples[:whole].reshape(-1, samples_per_peak)
+            mins.append(windows.min(axis=1))
+            maxs.append(windows.max(axis=1))
+        carry = samples[whole:]
+    if carry.size:
+        mins.append(carry.min(keepdims=True))
+        maxs.append(carry.max(keepdims=True))
+    if not mins:
+        return np.zeros(0, dtype="<i2"), np.zeros(0, dtype="<i2")
+    return np.concatenate(mins), np.concatenate(maxs)
+
+
+def downsample(mins, maxs, factor):
+    """Более крупный уровень из мелкого: min/max по группам из factor пиков"""
+    pad = -mins.size % factor
+    if pad:
+        mins = np.concatenate((mins, np.full(pad, mins[-1], dtype=mins.dtype)))
+        maxs = np.concatenate((maxs, np.full(pad, maxs[-1], dtype=maxs.dtype)))
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def write_dat(path, mins, maxs, sample_rate, samples_per_peak):
+    """Пики в .dat v1, 8 бит: пары (min, max) подряд"""
+    pairs = np.empty(mins.size * 2, dtype=np.int8)
+    pairs[0::2] = mins >> 8
+    pairs[1::2] = maxs >> 8
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(1, 1, sample_rate, samples_per_peak, mins.size))
+        f.write(pairs.tobytes())
+
+
+def compute_waveform(file_obj, key):
+    """
+    Обработчик ingest для аудио: файл декодируется один раз, пики всех
+    уровней пишутся в derived/<key>/waveform/<samples_per_peak>.dat
+    """
+    target_dir = waveform_dir(key)
+    meta_path = os.path.join(target_dir, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return json.load(f)
+
+    sample_rate = getattr(settings, "WAVEFORM_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+    levels = get_zoom_levels()
+    base = levels[0]
+
+    mins, maxs = compute_peaks(iter_pcm(file_obj.file.path, sample_rate, base * 4096), base)
+
+    tmp_dir = f"{target_dir}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_dir)
+    try:
+        for level in levels:
+            level_mins, level_maxs = downsample(mins, maxs, level // base) if level != base else (mins, maxs)
+            write_dat(os.path.join(tmp_dir, f"{level}.dat"), level_mins, level_maxs, sample_rate, level)
+        meta = {
+            "sample_rate": sample_rate,
+            "levels": levels,
+            "duration": round(mins.size * base / sample_rate, 3),
+        }
+        with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.replace(tmp_dir, target_dir)
+        except OSError:
+            if not os.path.exists(meta_path):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return meta
@@ -107,6 +107,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Параллельные чанки одной сессии пишут в БД одновременно:
+        # IMMEDIATE берёт блокировку записи сразу, timeout — ждать её, а не падать
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -175,9 +181,100 @@ STATIC_ROOT = BASE_DIR / "staticfiles"  # путь, куда Django собира
 MEDIA_ROOT = os.path.join(BASE_DIR, 'resource')
 MEDIA_URL = '/resource/'
 
+# Кто отдаёт байты файлов по /storage/api/v3/stream/<token>/:
+#   "django"     — сам Django (Range/206), удобно для разработки
+#   "x-accel"    — nginx по X-Accel-Redirect: location MEDIA_ACCEL_REDIRECT_PREFIX
+#                  должна быть internal и смотреть в MEDIA_ROOT
+#   "x-sendfile" — Apache mod_xsendfile / lighttpd по абсолютному пути
+MEDIA_DELIVERY_MODE = os.getenv('MEDIA_DELIVERY_MODE', 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected/'
+
 # settings.py
 DATA_UPLOAD_MAX_MEMORY_SIZE = 814572800     # 300 МБ (в байтах)
-FILE_UPLOAD_MAX_MEMORY_SIZE = 814572800
+
+# Файлы из multipart держатся в памяти только до этого порога, дальше пишутся на диск;
+# размер, SHA-256 и тип по сигнатуре считаются в том же проходе
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 МБ
+FILE_UPLOAD_HANDLERS = [
+    'storage.upload_handlers.HashingUploadHandler',
+]
+
+# Чанки читаются из входного потока блоками этого размера и сразу пишутся на диск,
+# поэтому на один запрос загрузки в памяти держится не больше CHUNK_UPLOAD_BUFFER_SIZE
+CHUNK_UPLOAD_BUFFER_SIZE = 1024 * 1024  # 1 МБ
+
+# Потоки локального пула, в котором собираются загруженные файлы (chunk_complete)
+UPLOAD_FINALIZE_WORKERS = 2
+
+# Удаление файлов с диска после удаления записей (пул "purge"): потоки и
+# сколько элементов очереди удаляется за один проход
+PURGE_WORKERS = 1
+PURGE_BATCH_SIZE = 500
+
+# Обработка файлов после загрузки (пул "media"): тип файла → {артефакт: обработчик}
+MEDIA_INGEST_WORKERS = 1
+MEDIA_INGEST_PROCESSORS = {
+    'video': {
+        # Сначала fast-start: после перепаковки обработка запускается заново для нового содержимого
+        'faststart': 'storage.faststart.make_faststart',
+        'thumbnails': 'storage.thumbnails.generate_thumbnails',
+        'hls': 'storage.hls.package_hls',
+    },
+    'audio': {
+        'waveform': 'storage.waveform.compute_waveform',
+    },
+    'document': {
+        'previews': 'storage.previews.warm_previews',
+    },
+}
+
+# Локальный ffmpeg для обработки медиа
+FFMPEG_BINARY = 'ffmpeg'
+FFPROBE_BINARY = 'ffprobe'
+FFMPEG_TIMEOUT = 6 * 60 * 60
+
+# HLS: лесенка качеств (битрейты в кбит/с; уровни выше исходника пропускаются)
+HLS_SEGMENT_SECONDS = 6
+HLS_X264_PRESET = 'veryfast'
+HLS_LADDER = [
+    {'name': '1080p', 'height': 1080, 'video_bitrate': 5000, 'audio_bitrate': 128},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+    {'name': '480p', 'height': 480, 'video_bitrate': 1400, 'audio_bitrate': 96},
+    {'name': '360p', 'height': 360, 'video_bitrate': 800, 'audio_bitrate': 96},
+]
+
+# Постер (кадр на POSTER_POSITION длительности) и спрайт-лист кадров для превью перемотки
+POSTER_WIDTH = 640
+POSTER_POSITION = 0.1
+SPRITE_THUMB_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_INTERVAL = 10
+SPRITE_MAX_FRAMES = 100
+
+# Превью страниц PDF: разрешение, сколько первых страниц рендерить сразу после
+# загрузки, пул процессов рендера (None — по числу ядер) и таймаут ожидания
+PDF_PREVIEW_DPI = 200
+PDF_PREVIEW_WARM_PAGES = 3
+PDF_RENDER_WORKERS = None
+PDF_RENDER_TIMEOUT = 120
+
+# Пики волновой формы аудио: частота декодирования и уровни масштаба
+# (отсчётов на пару min/max, каждый кратен первому)
+WAVEFORM_SAMPLE_RATE = 44100
+WAVEFORM_ZOOM_LEVELS = [256, 1024, 4096]
+
+# Брошенные сессии загрузки удаляются вместе с чанками: по возрасту и по простою.
+# Очистка идёт в фоне каждые UPLOAD_REAPER_INTERVAL секунд (None — только командой reap_uploads)
+UPLOAD_SESSION_MAX_AGE = timedelta(days=2)
+UPLOAD_SESSION_IDLE_TIMEOUT = timedelta(hours=6)
+# Задача сборки, не менявшаяся дольше этого (процесс перезапустили), считается
+# неудачной, а её сессия открывается заново
+UPLOAD_JOB_STALL_TIMEOUT = timedelta(hours=1)
+UPLOAD_REAPER_INTERVAL = 15 * 60
+
+# Квота на временные данные незавершённых загрузок (None — без ограничения)
+TEMP_UPLOAD_QUOTA_BYTES = None
+TEMP_UPLOAD_MAX_SESSIONS = None
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field